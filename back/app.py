@@ -1,11 +1,17 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-import wfdb
 import requests
 import os 
 from scipy.signal import butter, sosfilt, iirnotch, filtfilt, medfilt, resample
 import scipy.stats
 from utils import calculate_rr_intervals, heart_rate, heart_rate_variability
+from record_catalog import RecordCatalog
+from record_cache import record_cache
+from predict_client import predict_client, CircuitOpen, PREDICT_WIRE_FORMAT
+from wfdb_reader import parse_window, read_window
+from pcg import pcg_store, PCG_DURATION_S, PCG_ENVELOPE_POINTS
+from decimation import parse_max_points, minmax_decimate
+from ecg_format import negotiate_format, encode_rows, encode_columns, encode_binary, encode_predict_body, FORMAT_COLUMNS, FORMAT_BINARY, BINARY_DTYPES, BINARY_MIMETYPE
 from routes.users import users_bp
 from routes.devices import devices_bp
 from routes.reports import reports_bp
@@ -15,12 +21,24 @@ from routes.realtime import realtime_bp
 from routes.mongo_stream import mongo_stream_bp
 import numpy as np
 app = Flask(__name__)
+CORS_ORIGINS = ["http://localhost:5173"]
+CORS_EXPOSE_HEADERS = ["Authorization", "X-Total-Count", "X-Next-Cursor"]
 CORS(app,
-    resources={r"/api/*": {"origins": ["http://localhost:5173"]}},
+    resources={r"/api/*": {"origins": CORS_ORIGINS}},
     supports_credentials=True,
-    expose_headers=["Authorization"])
+    expose_headers=CORS_EXPOSE_HEADERS)
 
 BASE_ECG_DIR = os.getenv("ECG_DATA_DIR", "patients_test")
+PCG_RECORD = os.getenv("PCG_RECORD", "test/pcg/a0409")
+
+record_catalog = RecordCatalog(
+    BASE_ECG_DIR,
+    index_path=os.getenv("ECG_CATALOG_PATH"),
+    refresh_interval=float(os.getenv("ECG_CATALOG_REFRESH_S", 5)),
+)
+record_catalog.refresh()
+RECORD_FIELDS = ('id', 'class', 'path')
+RECORD_META_FIELDS = RECORD_FIELDS + ('fs', 'samples', 'leads', 'age', 'sex', 'diagnosis')
 
 # Register blueprints
 app.register_blueprint(users_bp)
@@ -33,63 +51,92 @@ app.register_blueprint(mongo_stream_bp)
 
 
 # ECG route: returns raw ECG signal for a given file
+# ?format=rows|columns|binary (or Accept: application/octet-stream), ?dtype=float32|int16 for binary
+# ?max_points=N or ?px_width=W decimates each lead (min/max) before serialization
+# ?start=&duration= (seconds) and ?leads=1,2 read only that window of the record
 @app.route('/api/ecg')
 def get_ecg():
     file_param = request.args.get('file')
     if not file_param: 
         return jsonify({'error': 'Missing file parameter'}), 400
-    ecg_file_path = os.path.join(BASE_ECG_DIR, file_param)
+    fmt = negotiate_format(request)
+    dtype = request.args.get('dtype', 'float32')
+    if fmt == FORMAT_BINARY and dtype not in BINARY_DTYPES:
+        return jsonify({'error': f'Unsupported dtype: {dtype}'}), 400
     try:
-        signal, fields = wfdb.rdsamp(ecg_file_path)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-    n_samples, n_leads = signal.shape
-    data = []
-    for i in range(n_samples):
-        entry = {'time': i}
-        for j in range(n_leads):
-            entry[f'lead{j+1}'] = float(signal[i, j])
-        data.append(entry)
-    return jsonify(data)
+        max_points = parse_max_points(request.args)
+        window = parse_window(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    ecg_file_path = os.path.join(BASE_ECG_DIR, file_param)
+
+    record, start, names = None, 0, None
+    if window is not None:
+        start_s, duration_s, leads = window
+        try:
+            record = read_window(ecg_file_path, start=start_s, duration=duration_s, leads=leads)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        signal, fields = record.physical(), record.fields()
+        start = record.start
+        if leads is not None:
+            names = [f'lead{i+1}' for i in leads]
+    else:
+        try:
+            signal, fields = record_cache.rdsamp(ecg_file_path)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    fs = fields.get('fs') if isinstance(fields, dict) else None
+
+    times = None
+    if max_points is not None and len(signal) > max_points:
+        times, signal = minmax_decimate(signal, max_points)
+        times = times + start
+    if fmt == FORMAT_BINARY:
+        if record is not None and times is None and dtype == 'int16':
+            # Window already in digital units: ship it with the header calibration
+            body = encode_binary(record.digital, fs=fs, start=start, dtype=dtype,
+                                 gains=record.gains, baselines=record.baselines, names=names)
+        else:
+            body = encode_binary(signal, fs=fs, start=start, dtype=dtype, times=times, names=names)
+        return Response(body, mimetype=BINARY_MIMETYPE)
+    if fmt == FORMAT_COLUMNS:
+        return jsonify(encode_columns(signal, fs=fs, start=start, times=times, names=names))
+    if times is None and start:
+        times = np.arange(start, start + len(signal))
+    return jsonify(encode_rows(signal, times=times, names=names))
 
 # List available ECG records under patients_test
+# ?class=, ?sex=, ?diagnosis= filter; ?offset=&limit= paginate (total in X-Total-Count)
 @app.route('/api/records')
 def list_records():
     target_class = request.args.get('class')
     include_meta = str(request.args.get('meta', 'false')).lower() == 'true'
-    records = []
     try:
-        class_dirs = [d for d in os.listdir(BASE_ECG_DIR) if os.path.isdir(os.path.join(BASE_ECG_DIR, d))]
-        if target_class:
-            class_dirs = [d for d in class_dirs if d == target_class]
-        for class_dir in class_dirs:
-            class_path = os.path.join(BASE_ECG_DIR, class_dir)
-            for name in os.listdir(class_path):
-                if not name.endswith('.hea'):
-                    continue
-                base = os.path.splitext(name)[0]
-                dat_path = os.path.join(class_path, base + '.dat')
-                if not os.path.exists(dat_path):
-                    continue
-                rel_path = os.path.join(class_dir, base).replace('\\', '/')
-                item = {
-                    'id': base,
-                    'class': class_dir,
-                    'path': rel_path,
-                }
-                if include_meta:
-                    try:
-                        header = wfdb.rdheader(os.path.join(class_path, base))
-                        fs = getattr(header, 'fs', None)
-                        sig_len = getattr(header, 'sig_len', None)
-                        n_sig = getattr(header, 'n_sig', None)
-                        item.update({'fs': fs, 'samples': sig_len, 'leads': n_sig})
-                    except Exception:
-                        pass
-                records.append(item)
-        return jsonify(records)
-    except FileNotFoundError:
-        return jsonify([])
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = request.args.get('limit')
+        limit = max(0, int(limit)) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    total, entries = record_catalog.query(
+        target_class=target_class,
+        sex=request.args.get('sex'),
+        diagnosis=request.args.get('diagnosis'),
+        offset=offset,
+        limit=limit,
+    )
+    fields = RECORD_META_FIELDS if include_meta else RECORD_FIELDS
+    records = [{k: e.get(k) for k in fields} for e in entries]
+    response = jsonify(records)
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+# Hit/miss/eviction counters of the shared WFDB record cache
+@app.route('/api/records/cache')
+def record_cache_stats():
+    return jsonify(record_cache.stats())
 
 # Prediction route: sends ECG data to microservice for a given file
 @app.route('/api/predict', methods=['POST'])
@@ -100,7 +147,7 @@ def predict():
         return jsonify({'error': 'Missing file parameter'}), 400
     ecg_file_path = os.path.join(BASE_ECG_DIR, file_param)
     try:
-        signal, fields = wfdb.rdsamp(ecg_file_path)
+        signal, fields = record_cache.rdsamp(ecg_file_path)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -136,13 +183,11 @@ def predict():
     # 5. Outlier removal (z-score)
     try:
         z_scores = np.abs(scipy.stats.zscore(sig))
-        outliers_mask = z_scores < 3.0
-        if np.sum(~outliers_mask) > 0:
+        outliers_mask = ~(z_scores < 3.0)
+        outliers_mask[[0, -1]] = False
+        if outliers_mask.any():
             sig_clean = sig.copy()
-            outlier_indices = np.where(~outliers_mask)[0]
-            for idx in outlier_indices:
-                if idx > 0 and idx < len(sig) - 1:
-                    sig_clean[idx] = (sig[idx - 1] + sig[idx + 1]) / 2
+            sig_clean[1:-1] = np.where(outliers_mask[1:-1], (sig[:-2] + sig[2:]) / 2, sig[1:-1])
             sig = sig_clean
     except Exception:
         pass
@@ -162,15 +207,36 @@ def predict():
         sig_norm = np.zeros_like(sig)
     sig_norm = np.clip(sig_norm, 0, 1)
 
-    ecg_data = sig_norm.tolist()
-    predict_url = os.getenv("PREDICT_URL", "http://localhost:5001/predict")
-
-    print('Prepared ECG array shape:', np.shape(ecg_data))
+    print('Prepared ECG array shape:', np.shape(sig_norm))
+    body, headers = encode_predict_body(sig_norm, PREDICT_WIRE_FORMAT)
     try:
-        response = requests.post(predict_url, json={"ecg": ecg_data})
-        return jsonify(response.json()), response.status_code
-    except requests.exceptions.RequestException as e:   
+        response = predict_client.post(body, headers)
+    except CircuitOpen as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(int(e.retry_after))}
+    except requests.exceptions.RequestException as e:
         return jsonify({"error": str(e)}), 500
+    # The predict service answer is relayed as-is
+    return Response(response.content, status=response.status_code,
+                    content_type=response.headers.get('Content-Type', 'application/json'))
+
+@app.route('/api/predict/client')
+def predict_client_stats():
+    return jsonify(predict_client.stats())
+
+# Display-ready PCG envelope, ?points= sets the resolution
+@app.route('/api/pcg')
+def get_pcg():
+    try:
+        points = int(request.args.get('points', PCG_ENVELOPE_POINTS))
+        duration = float(request.args.get('duration', PCG_DURATION_S))
+    except ValueError:
+        return jsonify({'error': 'points and duration must be numbers'}), 400
+    if points < 2 or duration <= 0:
+        return jsonify({'error': 'points must be >= 2 and duration > 0'}), 400
+    try:
+        return jsonify(pcg_store.envelope(PCG_RECORD, duration=duration, points=points))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/vitals')
 def vitals():
@@ -179,46 +245,20 @@ def vitals():
     pcg_signal = []
     if patient_param:
         normalized = patient_param.replace('\\', '/')
-        ecg_file_path = None
-
-        if '/' in normalized:
-            ecg_file_path = os.path.join(BASE_ECG_DIR, *normalized.split('/'))
-        else:
-            try:
-                candidates = [
-                    os.path.join(BASE_ECG_DIR, d, patient_param)
-                    for d in os.listdir(BASE_ECG_DIR)
-                    if os.path.isdir(os.path.join(BASE_ECG_DIR, d))
-                ]
-            except FileNotFoundError:
-                candidates = []
-
-            for cand in candidates:
-                try:
-                    signal, fields = wfdb.rdsamp(cand)
-                    ecg_file_path = cand
-                    break
-                except Exception:
-                    continue
-
-        if ecg_file_path is None:
-            ecg_file_path = os.path.join(BASE_ECG_DIR, patient_param)
+        if '/' not in normalized:
+            normalized = record_catalog.resolve(normalized) or normalized
+        ecg_file_path = os.path.join(BASE_ECG_DIR, *normalized.split('/'))
 
         try:
-            signal, fields = wfdb.rdsamp(ecg_file_path)
+            signal, fields = record_cache.rdsamp(ecg_file_path)
             fs = int(fields.get('fs', 500)) if isinstance(fields, dict) else 500
             rr_distances, r_peaks = calculate_rr_intervals(signal, fs=fs)
         except Exception as e:
             print('Error reading ECG file:', e)
             rr_distances = []
 
-        pcg_file_path = f"test/pcg/a0409"
         try:
-            pcg_signal, pcg_fields = wfdb.rdsamp(pcg_file_path)
-            pcg_signal = pcg_signal[:, 0].tolist()  
-            if 'fs' in pcg_fields:
-                sample_rate = int(pcg_fields['fs'])
-                pcg_signal = pcg_signal[:sample_rate * 10]
+            pcg_signal = pcg_store.envelope(PCG_RECORD)['signal']
         except Exception as e:
             print('Error reading PCG file:', e)
             pcg_signal = []
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import dotenv
+import httpx
+from a2wsgi import WSGIMiddleware
+from pymongo import AsyncMongoClient
+from pymongo.server_api import ServerApi
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, CORS_ORIGINS, CORS_EXPOSE_HEADERS
+from decimation import parse_max_points
+from ecg_format import encode_predict_body
+from predict_client import (AsyncPredictClient, CircuitOpen, predict_client, PREDICT_URL, PREDICT_CONNECT_TIMEOUT_S,
+                            PREDICT_READ_TIMEOUT_S, PREDICT_RETRIES, PREDICT_POOL_SIZE, PREDICT_WIRE_FORMAT)
+from routes.mongo_stream import (stream_results, vitals_from_docs, page_query, next_cursor, cursor_arg, device_query,
+                                 ring_fetch, ring_extend, stream_page, vitals_page, latest_prediction_input, sensor_feeds, Subscriber,
+                                 last_event_id, DEVICE_INDEX, KEEPALIVE_FRAME, SSE_HEADERS,
+                                 SSE_KEEPALIVE_S, SSE_QUEUE_SIZE)
+from routes.realtime import FORWARDED_HEADERS, wrap_prediction
+from sample_buffer import sample_buffers
+
+# Async serving mode: `uvicorn asgi:app`. The Mongo stream/vitals and realtime
+# predict routes run on the event loop; every other route is the Flask app,
+# run in a thread pool.
+
+# Threads for decoding/decimation/RR work so it does not block the event loop
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", os.cpu_count() or 1))
+# Threads serving the mounted Flask routes
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 10))
+# Longest wait for the sensors device index at startup
+SENSORS_INDEX_TIMEOUT_S = float(os.getenv("SENSORS_INDEX_TIMEOUT_S", 10))
+
+cpu_executor = ThreadPoolExecutor(ASYNC_CPU_WORKERS, thread_name_prefix='async-cpu')
+
+
+async def run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, fn, *args)
+
+
+def json_body(data):
+    return json.dumps(data).encode()
+
+
+async def json_response(data, status_code=200):
+    # Serialising thousands of samples is CPU work too
+    return Response(await run_cpu(json_body, data), status_code=status_code, media_type='application/json')
+
+
+async def sensors_collection(request):
+    """The sensors collection, or None when MongoDB or the collection is not available."""
+    client = request.app.state.mongo
+    if client is None:
+        return None
+    db = client.get_database('sensors_db')
+    try:
+        if not await db.list_collection_names(filter={'name': 'sensors'}):
+            return None
+    except Exception:
+        return None
+    return db['sensors']
+
+
+async def ring_request(sensors, args, build_page):
+    """Async counterpart of routes.mongo_stream.ring_request: the Mongo read is awaited, the ring work runs in the pool."""
+    after_id = cursor_arg(args)
+    if after_id is None:
+        return None
+    device = args.get('device', '')
+    ring = sample_buffers.get(device)
+    # Read without the lock, which a pool thread may hold; ring_extend re-checks under it
+    find_filter, direction, limit = ring_fetch(ring, device_query(device))
+    docs = await sensors.find(find_filter, {'batch': 1}).sort('_id', direction).limit(limit).to_list(None)
+
+    def extend_and_build():
+        # ring_extend skips documents another request appended meanwhile
+        with ring.lock:
+            ring_extend(ring, docs)
+            return build_page(ring, after_id)
+
+    return await run_cpu(extend_and_build)
+
+
+async def mongo_stream(request: Request):
+    sensors = await sensors_collection(request)
+    if sensors is None:
+        return JSONResponse({'error': 'MongoDB sensors collection not available'}, status_code=500)
+
+    count = int(request.query_params.get('count', 10))
+    try:
+        query, start = page_query(request.query_params)
+        max_points = parse_max_points(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    page = await ring_request(sensors, request.query_params,
+                              lambda ring, after_id: stream_page(ring, after_id, count, max_points))
+    if page is not None:
+        response = await json_response(page[0])
+        response.headers['X-Next-Cursor'] = page[1]
+        return response
+    docs = await sensors.find(query, {'batch': 1}).sort('_id', 1).skip(start).limit(count).to_list(None)
+    response = await json_response(await run_cpu(stream_results, docs, max_points))
+    response.headers['X-Next-Cursor'] = next_cursor(docs, request.query_params)
+    return response
+
+
+async def mongo_vitals(request: Request):
+    sensors = await sensors_collection(request)
+    if sensors is None:
+        return JSONResponse({'error': 'MongoDB sensors collection not available'}, status_code=500)
+
+    window = int(request.query_params.get('window', 10))
+    try:
+        query, start = page_query(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    page = await ring_request(sensors, request.query_params, lambda ring, after_id: vitals_page(ring, after_id, window))
+    if page is not None:
+        response = await json_response(page[0])
+        response.headers['X-Next-Cursor'] = page[1]
+        return response
+    docs = await sensors.find(query, {'batch': 1}).sort('_id', 1).skip(start).limit(window).to_list(None)
+    response = await json_response(await run_cpu(vitals_from_docs, docs))
+    response.headers['X-Next-Cursor'] = next_cursor(docs, request.query_params)
+    return response
+
+
+class AsyncSubscriber(Subscriber):
+    """Subscriber whose frames are handed to the event loop instead of a blocking queue."""
+
+    def __init__(self, loop, maxsize=SSE_QUEUE_SIZE):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.queue = asyncio.Queue()
+
+    def push(self, frame):
+        # Called from the feed thread
+        if self.queue.qsize() >= self.maxsize:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+            return False
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, frame)
+        return True
+
+
+async def mongo_events(request: Request):
+    # A viewer costs a queue and a coroutine; the shared feed thread does the Mongo reads
+    device = request.query_params.get('device', '')
+    subscriber = AsyncSubscriber(asyncio.get_running_loop())
+    await run_cpu(sensor_feeds.subscribe, device, subscriber, last_event_id(request.headers))
+
+    async def events():
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    frame = KEEPALIVE_FRAME
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            sensor_feeds.unsubscribe(device, subscriber)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def realtime_predict(request: Request):
+    body = await request.body()
+    headers = {k: v for k, v in request.headers.items() if k.title() in FORWARDED_HEADERS}
+    if not body and request.method == 'GET':
+        try:
+            signal = await run_cpu(latest_prediction_input, request.query_params.get('device', ''))
+        except Exception as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+        if signal is not None:
+            body, headers = encode_predict_body(signal, PREDICT_WIRE_FORMAT)
+    if not body:
+        return JSONResponse({"success": False, "error": "Missing 'ecg' data in request."}, status_code=400)
+    try:
+        response = await request.app.state.predict.post(body, headers)
+    except CircuitOpen as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=503,
+                            headers={"Retry-After": str(int(e.retry_after))})
+    except httpx.HTTPError as e:
+        return JSONResponse({"success": False, "error": str(e) or e.__class__.__name__}, status_code=500)
+    if not response.headers.get('Content-Type', '').startswith('application/json'):
+        return JSONResponse({"success": False, "error": f"Unexpected predict service answer ({response.status_code})"},
+                            status_code=502)
+    return Response(wrap_prediction(response.content), status_code=response.status_code,
+                    media_type='application/json')
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    dotenv.load_dotenv('.env')
+    uri = os.getenv('MONGO_URI_ECG')
+    # Async clients are bound to the running loop, so they are created here rather than at import
+    app.state.mongo = AsyncMongoClient(uri, server_api=ServerApi('1')) if uri else None
+    app.state.predict = AsyncPredictClient(
+        PREDICT_URL,
+        connect_timeout=PREDICT_CONNECT_TIMEOUT_S,
+        read_timeout=PREDICT_READ_TIMEOUT_S,
+        retries=PREDICT_RETRIES,
+        pool_size=PREDICT_POOL_SIZE,
+        breaker=predict_client.breaker,  # the Flask /api/predict route sees the same predict service
+    )
+    if app.state.mongo is not None:
+        # Device index of the feeds, before serving; an unreachable Mongo does not stop the startup
+        try:
+            sensors = app.state.mongo.get_database('sensors_db')['sensors']
+            await asyncio.wait_for(sensors.create_index(DEVICE_INDEX), SENSORS_INDEX_TIMEOUT_S)
+        except Exception as e:
+            print('Could not create the sensors device index:', e)
+    try:
+        yield
+    finally:
+        await app.state.predict.aclose()
+        if app.state.mongo is not None:
+            await app.state.mongo.close()
+
+
+# Same CORS policy as flask_cors in app.py, applied only to the async routes
+cors = [Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_credentials=True, allow_methods=['*'],
+                   allow_headers=['*'], expose_headers=CORS_EXPOSE_HEADERS)]
+
+app = Starlette(
+    routes=[
+        Route('/api/mongo/stream', mongo_stream, methods=['GET', 'OPTIONS'], middleware=cors),
+        Route('/api/mongo/vitals', mongo_vitals, methods=['GET', 'OPTIONS'], middleware=cors),
+        Route('/api/mongo/events', mongo_events, methods=['GET', 'OPTIONS'], middleware=cors),
+        Route('/api/realtime/predict', realtime_predict, methods=['GET', 'POST', 'OPTIONS'], middleware=cors),
+        Mount('/', WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -1,18 +1,18 @@
 import os
 import argparse
 import numpy as np
-import wfdb
 import matplotlib.pyplot as plt
+from wfdb_reader import read_window
 
 
-def read_ecg(base_dir: str, record_path: str):
-	"""Read an ECG record using WFDB. record_path can include or omit extension."""
+def read_ecg(base_dir: str, record_path: str, start: float = 0.0, duration: float | None = None, leads: list[int] | None = None):
+	"""Read an ECG record (or a start/duration window of it, in seconds) using WFDB. record_path can include or omit extension."""
 	# Normalize separators and strip extension if provided
 	record_path = record_path.replace('\\', '/').strip()
 	base = os.path.join(base_dir, *record_path.split('/'))
 	base_no_ext, _ = os.path.splitext(base)
-	signal, fields = wfdb.rdsamp(base_no_ext)
-	return signal, fields
+	record = read_window(base_no_ext, start=start, duration=duration, leads=leads)
+	return record.physical(), record.fields()
 
 
 def plot_ecg(signal: np.ndarray, fs: float, lead: int = 0, duration_s: float | None = None, title: str = "ECG Waveform"):
@@ -49,11 +49,11 @@ def main():
 	base_dir = os.getenv("ECG_DATA_DIR", os.path.join(os.path.dirname(__file__), "patients_test"))
 
 	try:
-		signal, fields = read_ecg(base_dir, args.record)
+		duration = None if args.duration is None or args.duration <= 0 else args.duration
+		signal, fields = read_ecg(base_dir, args.record, duration=duration, leads=[args.lead])
 		fs = int(fields.get('fs', 500)) if isinstance(fields, dict) else 500
 		title = f"ECG: {args.record} (lead {args.lead})"
-		duration = None if args.duration is None or args.duration <= 0 else args.duration
-		plot_ecg(signal, fs=fs, lead=args.lead, duration_s=duration, title=title)
+		plot_ecg(signal, fs=fs, lead=0, duration_s=duration, title=title)
 	except Exception as e:
 		print(f"Failed to plot ECG for '{args.record}': {e}")
 
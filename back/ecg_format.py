@@ -0,0 +1,167 @@
+import io
+import json
+import struct
+import numpy as np
+
+# Response formats understood by /api/ecg
+FORMAT_ROWS = 'rows'
+FORMAT_COLUMNS = 'columns'
+FORMAT_BINARY = 'binary'
+FORMATS = (FORMAT_ROWS, FORMAT_COLUMNS, FORMAT_BINARY)
+
+BINARY_MIMETYPE = 'application/octet-stream'
+BINARY_DTYPES = ('float32', 'int16')
+
+
+def negotiate_format(req):
+    """
+    Pick the ECG response format from the query string or the Accept header.
+    Args:
+        req: flask request
+    Returns:
+        one of FORMATS; defaults to the legacy per-sample rows
+    """
+    requested = (req.args.get('format') or '').lower()
+    if requested in FORMATS:
+        return requested
+    if req.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE:
+        return FORMAT_BINARY
+    return FORMAT_ROWS
+
+
+def lead_names(n_leads):
+    return [f'lead{j+1}' for j in range(n_leads)]
+
+
+def encode_rows(signal, times=None, names=None):
+    """
+    Legacy format: one {'time': i, 'lead1': ..., 'lead12': ...} dict per sample.
+    times overrides the sample index, e.g. after decimation or windowing.
+    """
+    signal = np.asarray(signal)
+    names = names or lead_names(signal.shape[1])
+    times = range(len(signal)) if times is None else np.asarray(times).tolist()
+    return [
+        {'time': t, **dict(zip(names, row))}
+        for t, row in zip(times, signal.tolist())
+    ]
+
+
+def encode_columns(signal, fs=None, start=0, times=None, names=None):
+    """
+    Column format: one array per lead, time is implicit (start + index)
+    unless an explicit times array is given, e.g. after decimation.
+    Args:
+        signal: numpy array of shape (samples, leads)
+        fs: sampling frequency in Hz
+        start: index of the first sample in the record
+        times: optional sample index of each row
+        names: optional lead keys (default lead1..leadN)
+    Returns:
+        JSON-serializable dict
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    n_samples, n_leads = signal.shape
+    names = names or lead_names(n_leads)
+    payload = {
+        'fs': fs,
+        'start': int(start),
+        'samples': int(n_samples),
+        'leads': names,
+        'data': {name: signal[:, j].tolist() for j, name in enumerate(names)},
+    }
+    if times is not None:
+        payload['time'] = np.asarray(times).tolist()
+    return payload
+
+
+def quantize_int16(signal):
+    """
+    Quantize a physical signal to int16 with one gain per lead.
+    Returns:
+        (int16 array, gains) where physical = digital / gain
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    peak = np.max(np.abs(signal), axis=0) if signal.size else np.zeros(signal.shape[1])
+    gains = np.where(peak > 0, 32767.0 / np.where(peak > 0, peak, 1.0), 1.0)
+    digital = np.rint(signal * gains).astype(np.int16)
+    return digital, gains
+
+
+def encode_binary(signal, fs=None, start=0, dtype='float32', gains=None, baselines=None, times=None, names=None):
+    """
+    Binary format: <uint32 header length><JSON header><sample-major little-endian body>.
+
+    The header is padded with spaces so the body starts on an 8-byte boundary
+    and can be read in the browser with a typed array view without copying.
+    For int16 bodies the header carries the per-lead gain and baseline:
+    physical = (digital - baseline) / gain. Decimated bodies also carry the
+    sample index of each row in header['time'].
+    Args:
+        signal: physical (samples, leads) array, or digital int16 when gains are given
+        dtype: 'float32' or 'int16'
+    Returns:
+        bytes
+    """
+    if dtype not in BINARY_DTYPES:
+        raise ValueError(f'Unsupported dtype: {dtype}')
+    signal = np.asarray(signal)
+    n_samples, n_leads = signal.shape
+    header = {
+        'fs': fs,
+        'start': int(start),
+        'samples': int(n_samples),
+        'leads': names or lead_names(n_leads),
+        'dtype': dtype,
+        'layout': 'interleaved',
+    }
+    if times is not None:
+        header['time'] = np.asarray(times).tolist()
+    if dtype == 'int16':
+        if gains is None:
+            body, gains = quantize_int16(signal)
+            baselines = None
+        else:
+            body = np.asarray(signal, dtype=np.int16)
+        header['gain'] = [float(g) for g in gains]
+        header['baseline'] = [int(b) for b in baselines] if baselines is not None else [0] * n_leads
+        body = body.astype('<i2', copy=False)
+    else:
+        body = signal.astype('<f4', copy=False)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(len(header_bytes) + 4) % 8)
+    return struct.pack('<I', len(header_bytes)) + header_bytes + np.ascontiguousarray(body).tobytes()
+
+
+# Wire formats for ECG windows sent to the predict service
+NPY_MIMETYPE = 'application/x-npy'
+PREDICT_WIRE_FORMATS = ('json', 'npy', 'raw')
+
+
+def encode_predict_body(signal, wire='json', key='ecg'):
+    """
+    Encode an ECG window for the predict service /predict.
+    Args:
+        signal: array of samples, e.g. (n_samples,) or (n_samples, n_leads)
+        wire: 'json' ({key: [...]}), 'npy' (application/x-npy) or
+              'raw' (little-endian float32 with X-Shape/X-Dtype headers)
+        key: JSON key for the 'json' wire format
+    Returns:
+        (body bytes, headers dict)
+    """
+    if wire == 'json':
+        return json.dumps({key: np.asarray(signal).tolist()}).encode(), {'Content-Type': 'application/json'}
+    data = np.ascontiguousarray(signal, dtype='<f4')
+    if wire == 'npy':
+        header = {'descr': '<f4', 'fortran_order': False, 'shape': data.shape}
+        buffer = io.BytesIO()
+        np.lib.format.write_array_header_1_0(buffer, header)
+        return buffer.getvalue() + data.tobytes(), {'Content-Type': NPY_MIMETYPE}
+    if wire == 'raw':
+        return data.tobytes(), {
+            'Content-Type': BINARY_MIMETYPE,
+            'X-Shape': ','.join(str(n) for n in data.shape),
+            'X-Dtype': 'float32',
+        }
+    raise ValueError(f'wire must be one of {PREDICT_WIRE_FORMATS}')
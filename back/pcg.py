@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from decimation import minmax_decimate
+from wfdb_reader import read_window
+
+PCG_DURATION_S = float(os.getenv('PCG_DURATION_S', 10))
+PCG_ENVELOPE_POINTS = int(os.getenv('PCG_ENVELOPE_POINTS', 2000))
+
+
+def _pcg_mtime(record_path):
+    mtimes = []
+    for ext in ('.hea', '.wav', '.dat'):
+        try:
+            mtimes.append(os.stat(record_path + ext).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    if mtimes[0] is None:
+        raise FileNotFoundError(record_path + '.hea')
+    return tuple(mtimes)
+
+
+class PcgStore:
+    """
+    Decodes each PCG record once and keeps a display-ready min/max envelope.
+
+    Envelopes are cached by (record, duration, points) and invalidated when
+    the record files change, so vitals polls only reuse a ready list.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def envelope(self, record_path, duration=PCG_DURATION_S, points=PCG_ENVELOPE_POINTS):
+        """
+        Args:
+            record_path: PCG record path without extension (first channel is the PCG)
+            duration: seconds from the start of the record
+            points: max number of envelope points
+        Returns:
+            dict with fs, duration, time (sample index) and signal (envelope values)
+        """
+        record_path = os.path.abspath(record_path)
+        key = (record_path, duration, points)
+        mtime = _pcg_mtime(record_path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        record = read_window(record_path, duration=duration, leads=[0])
+        samples = record.physical()[:, 0]
+        times, values = minmax_decimate(samples, points)
+        payload = {
+            'fs': record.fs,
+            'duration': len(samples) / float(record.fs),
+            'time': times.tolist(),
+            'signal': np.round(values, 4).tolist(),
+        }
+
+        with self._lock:
+            self._entries[key] = (mtime, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+
+pcg_store = PcgStore()
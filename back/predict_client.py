@@ -0,0 +1,234 @@
+import asyncio
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpen(Exception):
+    """Raised without touching the network while the predict service is considered down."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Predict service unavailable, retry in {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail immediately for `reset_timeout` seconds. The first call after that
+    is let through as a probe (half-open): success closes the circuit, a
+    failure opens it again for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        """Raises CircuitOpen if the call must not be attempted."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                self.rejected += 1
+                raise CircuitOpen(max(remaining, 1.0))
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() >= self._opened_at + self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+
+class PredictClient:
+    """
+    Shared HTTP client for the predict service.
+
+    One requests.Session per process keeps connections to the predict service
+    alive (`pool_size` per host), so a request does not pay TCP setup. Every
+    call has a connect and a read timeout; connection errors and 502/503/504
+    answers are retried `retries` times with backoff. Bodies are sent as the
+    bytes they arrive in and answers are returned unparsed.
+    """
+
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, url, connect_timeout=2.0, read_timeout=30.0, retries=2, backoff=0.2, pool_size=10,
+                 breaker=None):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # a read timeout means the model is slow; retrying would only hold the worker longer
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({'POST'}),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def post(self, data, headers=None, url=None):
+        """
+        POST `data` (bytes) to the predict service.
+        Returns:
+            requests.Response, whose .content is the raw answer
+        Raises:
+            CircuitOpen: the circuit is open, nothing was sent
+            requests.exceptions.RequestException: after retries were exhausted
+        """
+        self.breaker.before_call()
+        with self._lock:
+            self.calls += 1
+        try:
+            response = self.session.post(url or self.url, data=data, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self._failed()
+            raise
+        if response.status_code in self.RETRY_STATUSES:
+            self._failed()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+        self.breaker.record_failure()
+
+    def stats(self):
+        with self._lock:
+            calls, failures = self.calls, self.failures
+        return {
+            'url': self.url,
+            'calls': calls,
+            'failures': failures,
+            'circuit': self.breaker.state,
+            'circuit_opened': self.breaker.opened,
+            'rejected': self.breaker.rejected,
+        }
+
+
+class AsyncPredictClient(PredictClient):
+    """
+    asyncio counterpart of PredictClient, used by the ASGI mode (asgi.py).
+
+    Same timeouts, retries and breaker semantics on top of one pooled
+    httpx.AsyncClient; a call waiting on the predict service holds no thread.
+    Must be created and closed inside the running event loop.
+    """
+
+    def __init__(self, url, connect_timeout=2.0, read_timeout=30.0, retries=2, backoff=0.2, pool_size=10,
+                 breaker=None):
+        import httpx  # only needed by the ASGI mode
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            # Limits go on the transport: the client ignores its own when given one
+            transport=httpx.AsyncHTTPTransport(
+                retries=retries,  # connection errors only
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            ),
+        )
+        self.errors = (httpx.HTTPError,)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    async def post(self, data, headers=None, url=None):
+        """
+        Returns:
+            httpx.Response, whose .content is the raw answer
+        Raises:
+            CircuitOpen: the circuit is open, nothing was sent
+            httpx.HTTPError: after retries were exhausted
+        """
+        self.breaker.before_call()
+        with self._lock:
+            self.calls += 1
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.post(url or self.url, content=data, headers=headers)
+            except self.errors:
+                self._failed()
+                raise
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                break
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+        if response.status_code in self.RETRY_STATUSES:
+            self._failed()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def wrap_prediction(content):
+    """{"success": true, "prediction": <answer>} built around the raw JSON answer bytes."""
+    return b'{"success": true, "prediction": ' + content + b'}'
+
+
+PREDICT_URL = os.getenv("PREDICT_URL", "http://localhost:5001/predict")
+PREDICT_CONNECT_TIMEOUT_S = float(os.getenv("PREDICT_CONNECT_TIMEOUT_S", 2))
+PREDICT_READ_TIMEOUT_S = float(os.getenv("PREDICT_READ_TIMEOUT_S", 30))
+PREDICT_RETRIES = int(os.getenv("PREDICT_RETRIES", 2))
+PREDICT_POOL_SIZE = int(os.getenv("PREDICT_POOL_SIZE", 10))
+# json | npy | raw: how ECG windows are sent to the predict service
+PREDICT_WIRE_FORMAT = os.getenv("PREDICT_WIRE_FORMAT", "json")
+
+predict_client = PredictClient(
+    PREDICT_URL,
+    connect_timeout=PREDICT_CONNECT_TIMEOUT_S,
+    read_timeout=PREDICT_READ_TIMEOUT_S,
+    retries=PREDICT_RETRIES,
+    pool_size=PREDICT_POOL_SIZE,
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("PREDICT_BREAKER_FAILURES", 5)),
+        reset_timeout=float(os.getenv("PREDICT_BREAKER_RESET_S", 30)),
+    ),
+)
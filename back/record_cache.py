@@ -0,0 +1,90 @@
+import os
+import threading
+from collections import OrderedDict
+import wfdb
+
+
+def _record_mtime(record_path):
+    """mtime of the .hea and .dat files of a record; raises FileNotFoundError when the header is missing."""
+    hea_mtime = os.stat(record_path + '.hea').st_mtime_ns
+    try:
+        dat_mtime = os.stat(record_path + '.dat').st_mtime_ns
+    except OSError:
+        dat_mtime = None
+    return hea_mtime, dat_mtime
+
+
+class RecordCache:
+    """
+    Process-wide LRU cache of decoded WFDB records (wfdb.rdsamp output).
+
+    Entries are keyed by absolute record path and invalidated when the
+    .hea/.dat mtime changes. The total size of the cached signal arrays is
+    kept under `max_bytes`; least recently used records are evicted first.
+    Cached arrays are read-only because they are shared between requests.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def rdsamp(self, record_path):
+        """
+        Drop-in replacement for wfdb.rdsamp(record_path) served from the cache.
+        Returns:
+            (signal, fields) where signal is a read-only numpy array
+        """
+        key = os.path.abspath(record_path)
+        mtime = _record_mtime(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+
+        signal, fields = wfdb.rdsamp(key)
+        signal.setflags(write=False)
+        self._put(key, mtime, signal, fields)
+        return signal, fields
+
+    def _put(self, key, mtime, signal, fields):
+        size = signal.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1].nbytes
+            self._entries[key] = (mtime, signal, fields)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+record_cache = RecordCache(int(os.getenv('ECG_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import wfdb
+
+CATALOG_VERSION = 1
+
+
+def parse_header_comments(comments):
+    """
+    Extract patient info from WFDB header comments ('# Age: 59 ans', '# Sexe: F', '# Diagnostic: ...').
+    Args:
+        comments: list of comment strings (without the leading '#')
+    Returns:
+        dict with age, sex and diagnosis (None when missing)
+    """
+    info = {'age': None, 'sex': None, 'diagnosis': None}
+    for comment in comments or []:
+        key, sep, value = comment.strip().lstrip('#').partition(':')
+        if not sep:
+            continue
+        key = key.strip().lower()
+        value = value.strip()
+        if key == 'age':
+            try:
+                info['age'] = int(value.split()[0])
+            except (ValueError, IndexError):
+                pass
+        elif key in ('sexe', 'sex'):
+            info['sex'] = value or None
+        elif key in ('diagnostic', 'diagnosis'):
+            info['diagnosis'] = value or None
+    return info
+
+
+def scan_class_dir(base_dir, class_dir):
+    """
+    Read every complete (.hea + .dat) record of one class directory.
+    Returns:
+        list of record entries sorted by id
+    """
+    class_path = os.path.join(base_dir, class_dir)
+    names = set(os.listdir(class_path))
+    entries = []
+    for name in sorted(names):
+        if not name.endswith('.hea'):
+            continue
+        base = os.path.splitext(name)[0]
+        if base + '.dat' not in names:
+            continue
+        entry = {
+            'id': base,
+            'class': class_dir,
+            'path': f'{class_dir}/{base}',
+            'fs': None,
+            'samples': None,
+            'leads': None,
+            'age': None,
+            'sex': None,
+            'diagnosis': None,
+        }
+        try:
+            header = wfdb.rdheader(os.path.join(class_path, base))
+            entry.update({
+                'fs': getattr(header, 'fs', None),
+                'samples': getattr(header, 'sig_len', None),
+                'leads': getattr(header, 'n_sig', None),
+            })
+            entry.update(parse_header_comments(getattr(header, 'comments', None)))
+        except Exception:
+            pass
+        entries.append(entry)
+    return entries
+
+
+def default_index_path(base_dir):
+    """
+    Index file for `base_dir` in the user cache directory (temp directory as a fallback),
+    so the dataset directory is never written to.
+    """
+    cache_root = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    if not os.path.isabs(cache_root):
+        cache_root = tempfile.gettempdir()
+    digest = hashlib.sha1(os.path.abspath(base_dir).encode()).hexdigest()[:16]
+    return os.path.join(cache_root, 'ecg-catalog', f'{digest}.json')
+
+
+class RecordCatalog:
+    """
+    In-memory index of the records under ECG_DATA_DIR, persisted as JSON.
+
+    Each class directory is rescanned only when its mtime changes, so a
+    refresh costs one stat per class directory. Refreshes are throttled to
+    one every `refresh_interval` seconds.
+    """
+
+    def __init__(self, base_dir, index_path=None, refresh_interval=5.0):
+        self.base_dir = base_dir
+        self.index_path = index_path or default_index_path(base_dir)
+        self.refresh_interval = refresh_interval
+        self._classes = {}
+        self._records = []
+        self._by_id = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CATALOG_VERSION and data.get('base_dir') == os.path.abspath(self.base_dir):
+                self._classes = data.get('classes', {})
+        except (OSError, ValueError):
+            self._classes = {}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._records = [r for d in sorted(self._classes) for r in self._classes[d]['records']]
+        self._by_id = {}
+        for r in self._records:
+            self._by_id.setdefault(r['id'], r['path'])
+
+    def _save(self):
+        data = {
+            'version': CATALOG_VERSION,
+            'base_dir': os.path.abspath(self.base_dir),
+            'classes': self._classes,
+        }
+        tmp_path = None
+        try:
+            index_dir = os.path.dirname(os.path.abspath(self.index_path))
+            os.makedirs(index_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.catalog-', suffix='.tmp', dir=index_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            # Unwritable location: the index is kept in memory only and rebuilt on the next start
+            print(f'Could not save the record catalog to {self.index_path}: {e}')
+            if tmp_path is not None and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def refresh(self, force=False):
+        """Rescan the class directories whose mtime changed since the last scan."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+
+            try:
+                class_dirs = [d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d))]
+            except FileNotFoundError:
+                class_dirs = []
+
+            changed = set(self._classes) - set(class_dirs)
+            for d in changed:
+                del self._classes[d]
+            for class_dir in class_dirs:
+                mtime = os.stat(os.path.join(self.base_dir, class_dir)).st_mtime_ns
+                cached = self._classes.get(class_dir)
+                if cached is not None and cached.get('mtime') == mtime:
+                    continue
+                self._classes[class_dir] = {'mtime': mtime, 'records': scan_class_dir(self.base_dir, class_dir)}
+                changed.add(class_dir)
+
+            if changed:
+                self._rebuild()
+                self._save()
+
+    def query(self, target_class=None, sex=None, diagnosis=None, offset=0, limit=None):
+        """
+        Filter and paginate the catalog.
+        Returns:
+            (total number of matches, list of entries for the requested page)
+        """
+        self.refresh()
+        with self._lock:
+            if target_class:
+                group = self._classes.get(target_class)
+                records = group['records'] if group else []
+            else:
+                records = self._records
+
+        if sex:
+            records = [r for r in records if (r.get('sex') or '').lower() == sex.lower()]
+        if diagnosis:
+            records = [r for r in records if diagnosis.lower() in (r.get('diagnosis') or '').lower()]
+
+        total = len(records)
+        end = None if limit is None else offset + limit
+        return total, records[offset:end]
+
+    def resolve(self, record_id):
+        """
+        Map a bare record id (e.g. 'patient_classe_0_001') to its relative path.
+        An unknown id forces a rescan of the changed class directories once.
+        Returns:
+            'Class/record' or None
+        """
+        self.refresh()
+        path = self._by_id.get(record_id)
+        if path is None:
+            self.refresh(force=True)
+            path = self._by_id.get(record_id)
+        return path
@@ -1,12 +1,36 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 import os
+import base64
+import binascii
+import json
+import queue
+import threading
+import traceback
+from collections import deque
+import bson
 import dotenv
 import numpy as np
 from utils import calculate_rr_intervals, heart_rate, heart_rate_variability
+from decimation import parse_max_points, minmax_decimate
+from sample_buffer import sample_buffers, batch_to_array
+from ecg_format import encode_predict_body
+from predict_client import predict_client, PREDICT_WIRE_FORMAT, wrap_prediction
 from flask import g, has_app_context
 
+# Field of a sensors document naming its device; /api/mongo/events?device= filters on it
+SENSORS_DEVICE_FIELD = os.getenv('SENSORS_DEVICE_FIELD', 'device_id')
+SSE_POLL_INTERVAL_S = float(os.getenv('SSE_POLL_INTERVAL_S', 0.5))
+SSE_WINDOW = int(os.getenv('SSE_WINDOW', 10))
+SSE_KEEPALIVE_S = float(os.getenv('SSE_KEEPALIVE_S', 15))
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', 256))
+SSE_PREDICT = os.getenv('SSE_PREDICT', 'true').lower() in ('1', 'true', 'yes')
+# Most sensors documents read into a device's sample ring per Mongo query
+SAMPLE_BUFFER_SYNC_BATCHES = int(os.getenv('SAMPLE_BUFFER_SYNC_BATCHES', 100))
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
 def get_sensors_db():
     if has_app_context():
         if 'sensors_db' not in g:
@@ -21,46 +45,117 @@ def get_sensors_db():
         return g.sensors_db
     return None
 
-mongo_stream_bp = Blueprint('mongo_stream', __name__)
+_shared_client = None
+_shared_client_lock = threading.Lock()
 
-@mongo_stream_bp.route('/api/mongo/stream', methods=['GET'])
-def mongo_stream():
-    sensors_db = get_sensors_db()
-    if sensors_db is None or 'sensors' not in sensors_db.list_collection_names():
-        return jsonify({'error': 'MongoDB sensors collection not available'}), 500
+def shared_sensors_db():
+    """sensors_db on one MongoClient per process, for the background feeds."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            dotenv.load_dotenv('.env')
+            _shared_client = MongoClient(os.getenv('MONGO_URI_ECG', None), server_api=ServerApi('1'))
+    return _shared_client.get_database('sensors_db')
 
-    start = int(request.args.get('start', 0))
-    count = int(request.args.get('count', 10))
-    docs = sensors_db['sensors'].find().sort('_id', 1).skip(start).limit(count)
+def encode_cursor(doc_id):
+    """Opaque pagination cursor for a sensors `_id` (ObjectId, int, string...)."""
+    return base64.urlsafe_b64encode(bson.encode({'_id': doc_id})).decode().rstrip('=')
 
-    results = []
-    for doc in docs:
-        batch = doc.get('batch', [])
-        ecg = [[float(sample.get(f'lead{i}', 0)) for i in range(1, 13)] for sample in batch]
-        results.append({'ecg': ecg[:5000]})
+def decode_cursor(cursor):
+    """Raises ValueError when the cursor was not made by encode_cursor."""
+    try:
+        return bson.decode(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))['_id']
+    except (binascii.Error, bson.errors.BSONError, KeyError, TypeError, ValueError):
+        raise ValueError('invalid cursor')
 
-    return jsonify(results)
+def cursor_arg(args):
+    """Decoded `after` cursor of the request, None when absent."""
+    after = args.get('after')
+    return decode_cursor(after) if after else None
 
-@mongo_stream_bp.route('/api/mongo/vitals', methods=['GET'])
-def mongo_vitals():
-    sensors_db = get_sensors_db()
-    if sensors_db is None or 'sensors' not in sensors_db.list_collection_names():
-        return jsonify({'error': 'MongoDB sensors collection not available'}), 500
+def last_event_id(headers):
+    """Batch `_id` of the SSE Last-Event-ID header sent by a reconnecting EventSource; None when absent or invalid."""
+    value = headers.get('Last-Event-ID')
+    try:
+        return decode_cursor(value) if value else None
+    except ValueError:
+        return None
 
-    window = int(request.args.get('window', 10))
-    start = int(request.args.get('start', 0))
-    docs = sensors_db['sensors'].find().sort('_id', 1).skip(start).limit(window)
+def device_query(device):
+    return {SENSORS_DEVICE_FIELD: device} if device else {}
 
-    all_samples = []
-    for doc in docs:
-        batch = doc.get('batch', [])
-        all_samples.extend(batch)
+def page_query(args):
+    """
+    Filter of a page of sensors documents.
+    Args:
+        args: request args; `after` is a cursor, `start` the legacy offset
+    Returns:
+        (filter, skip): an indexed `_id` range after the cursor, or {} and the offset
+    Raises:
+        ValueError: invalid cursor
+    """
+    after_id = cursor_arg(args)
+    query = device_query(args.get('device', ''))
+    if after_id is not None:
+        return {**query, '_id': {'$gt': after_id}}, 0
+    return query, int(args.get('start', 0))
 
-    signal = np.zeros((len(all_samples), 12))
-    for i, sample in enumerate(all_samples):
-        for j in range(12):
-            signal[i, j] = float(sample.get(f'lead{j+1}', 0))
+def next_cursor(docs, args):
+    """Cursor to pass as `after` for the following page; unchanged when the page is empty."""
+    return encode_cursor(docs[-1]['_id']) if docs else args.get('after', '')
 
+# Index of the per-device `_id` range queries of the feeds
+DEVICE_INDEX = [(SENSORS_DEVICE_FIELD, 1), ('_id', 1)]
+
+def ensure_device_index(sensors):
+    """Creates the (device, _id) index; a failure is logged, the routes still work without it."""
+    try:
+        sensors.create_index(DEVICE_INDEX)
+    except Exception as e:
+        print('Could not create the sensors device index:', e)
+
+def ring_fetch(ring, query, latest=SSE_WINDOW, limit=SAMPLE_BUFFER_SYNC_BATCHES):
+    """
+    Mongo read that brings a device's sample ring up to date (call under ring.lock).
+    The ring only follows the head of the stream, which the SSE feed publishes as live:
+    an empty ring starts from the `latest` most recent documents, never from a page cursor.
+    Returns:
+        (filter, sort direction, limit): documents after the ring's last batch, or the latest ones
+    """
+    if ring.last_id is not None:
+        return {**query, '_id': {'$gt': ring.last_id}}, 1, limit
+    return query, -1, latest
+
+def ring_extend(ring, docs):
+    """Appends the documents newer than the ring's last batch (call under ring.lock); returns their _ids."""
+    added = []
+    for doc in sorted(docs, key=lambda d: d['_id']):
+        if ring.last_id is None or doc['_id'] > ring.last_id:
+            ring.append(doc['_id'], batch_to_array(doc.get('batch', [])))
+            added.append(doc['_id'])
+    return added
+
+def sync_ring(ring, sensors, query, latest=SSE_WINDOW):
+    """ring_fetch + ring_extend with a blocking collection (call under ring.lock)."""
+    find_filter, direction, limit = ring_fetch(ring, query, latest)
+    docs = list(sensors.find(find_filter, {'batch': 1}).sort('_id', direction).limit(limit))
+    return ring_extend(ring, docs)
+
+# Response bodies shared by the Flask routes and the async ones (asgi.py)
+def stream_item(samples, max_points=None):
+    """One /api/mongo/stream item from a (n, 12) batch, min/max decimated to `max_points` when given."""
+    samples = samples[:5000]
+    if max_points is not None and len(samples) > max_points:
+        times, ecg = minmax_decimate(samples, max_points)
+        return {'ecg': ecg.tolist(), 'time': times.tolist()}
+    return {'ecg': samples.tolist()}
+
+def stream_results(docs, max_points=None):
+    """ECG of each sensor batch, min/max decimated to `max_points` when given."""
+    return [stream_item(batch_to_array(doc.get('batch', [])), max_points) for doc in docs]
+
+def vitals_from_signal(signal):
+    """Vitals computed over a (n, 12) window of samples."""
     try:
         rr_distances, _ = calculate_rr_intervals(signal)
     except:
@@ -81,4 +176,340 @@ def mongo_vitals():
         'rrIntervalAvg': avg_rr,
     }
 
-    return jsonify(vitals)
+    return vitals
+
+def vitals_from_docs(docs):
+    """Vitals computed over the samples of consecutive sensor batches."""
+    arrays = [batch_to_array(doc.get('batch', [])) for doc in docs]
+    return vitals_from_signal(np.concatenate(arrays) if arrays else np.zeros((0, 12)))
+
+def ring_page(ring, after_id, count, build):
+    """
+    `build` applied to the `count` buffered batches after `after_id` (call under ring.lock).
+    Returns:
+        (body, next cursor), or None when the page is not in the ring
+    """
+    page = ring.batches_after(after_id, count)
+    if page is None:
+        return None
+    return build(page), encode_cursor(page[-1][0] if page else after_id)
+
+def stream_page(ring, after_id, count, max_points=None):
+    return ring_page(ring, after_id, count, lambda page: [stream_item(view, max_points) for _, view in page])
+
+def vitals_page(ring, after_id, count):
+    return ring_page(ring, after_id, count, lambda page: vitals_from_signal(ring.window([i for i, _ in page])))
+
+def ring_request(sensors, args, build_page):
+    """
+    Cursor page (`after`) served from the device's sample ring, after reading only the
+    documents the ring does not have yet; None for offset pages or when the cursor is not
+    in the ring, which the caller then reads from Mongo without moving the ring.
+    """
+    after_id = cursor_arg(args)
+    if after_id is None:
+        return None
+    ring = sample_buffers.get(args.get('device', ''))
+    with ring.lock:
+        sync_ring(ring, sensors, device_query(args.get('device', '')))
+        return build_page(ring, after_id)
+
+def latest_prediction_input(device='', window=SSE_WINDOW):
+    """Prediction input over the device's last `window` batches, from its sample ring; None without samples."""
+    ring = sample_buffers.get(device)
+    with ring.lock:
+        sync_ring(ring, shared_sensors_db()['sensors'], device_query(device), latest=window)
+        _, signal = ring.last_batches(window)
+        return prediction_input(signal)
+
+def prediction_input(signal, length=187):
+    """First lead of the window, linearly resampled to `length` and min-max normalised (as the dashboard did)."""
+    lead = np.asarray(signal)[:, 0]
+    if lead.size == 0:
+        return None
+    if lead.size != length:
+        lead = np.interp(np.linspace(0, lead.size - 1, length), np.arange(lead.size), lead)
+    span = lead.max() - lead.min()
+    return (lead - lead.min()) / span if span > 0 else np.zeros(length)
+
+def sse_frame(event, data, event_id=None):
+    """Server-sent event frame; `data` is JSON bytes, one `data:` line per line."""
+    head = f'event: {event}\n' + (f'id: {event_id}\n' if event_id is not None else '')
+    return head.encode() + b''.join(b'data: ' + line + b'\n' for line in data.splitlines()) + b'\n'
+
+class Subscriber:
+    """One viewer of a feed: frames are queued by the feed thread and read by the response."""
+
+    def __init__(self, maxsize=SSE_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+
+    def push(self, frame):
+        """Returns False when the viewer is dropped."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            # Reader too slow: end its stream; EventSource reconnects and resumes after its Last-Event-ID
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(None)
+            return False
+
+class SensorFeed:
+    """
+    Follows the sensors documents of one device and fans them out to its viewers.
+
+    A single thread reads new documents into the device's sample ring with an
+    `_id` range query, builds each event once from ring views (batch, vitals
+    over the last `window` batches, latest prediction) and pushes the same
+    encoded frame to every subscriber. New
+    subscribers are first sent the current window, vitals and prediction;
+    a reconnecting one (Last-Event-ID) only gets the batches it has not seen.
+    Mongo and predict-service load therefore follow the data rate of the
+    device, not the number of viewers.
+    """
+
+    def __init__(self, device, collection_fn=None, window=SSE_WINDOW, poll_interval=SSE_POLL_INTERVAL_S,
+                 predict=SSE_PREDICT):
+        self.device = device
+        self.collection_fn = collection_fn or (lambda: shared_sensors_db()['sensors'])
+        self.query = device_query(device)
+        self.window = window
+        self.poll_interval = poll_interval
+        self.predict = predict
+        self.batch_frames = deque(maxlen=window)  # (batch _id, frame)
+        self.latest = {}
+        self.last_id = None
+        self.subscribers = []
+        self.polls = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'sensor-feed-{device or "all"}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def add(self, subscriber, after_id=None):
+        """Registers `subscriber`, replaying the buffered batches after `after_id` (all when None)."""
+        with self._lock:
+            for frame in [*self._replay(after_id), *self.latest.values()]:
+                subscriber.push(frame)
+            self.subscribers.append(subscriber)
+
+    def _replay(self, after_id):
+        if after_id is None:
+            return [frame for _, frame in self.batch_frames]
+        try:
+            return [frame for batch_id, frame in self.batch_frames if batch_id > after_id]
+        except TypeError:
+            # Cursor of another _id type: not one of this feed's batches
+            return [frame for _, frame in self.batch_frames]
+
+    def remove(self, subscriber):
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            return len(self.subscribers)
+
+    def _publish(self, frame):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if self._push(s, frame)]
+
+    @staticmethod
+    def _push(subscriber, frame):
+        try:
+            return subscriber.push(frame)
+        except Exception:
+            return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sensors = self.collection_fn()
+                ring = sample_buffers.get(self.device)
+                with ring.lock:
+                    # A new ring starts from the current window rather than the beginning of the stream
+                    sync_ring(ring, sensors, self.query, latest=self.window)
+                    page = ring.batches_after(self.last_id, len(ring.batches)) if self.last_id is not None else None
+                    # Batches appended by the stream/vitals routes are published too
+                    new_ids = [i for i, _ in page] if page is not None else ring.last_batches(self.window)[0]
+                    self.polls += 1
+                    signal = self._on_batches(ring, new_ids) if new_ids else None
+                if signal is not None:
+                    self._predict(signal)
+                if new_ids:
+                    continue
+            except Exception as e:
+                print('Sensor feed error:', traceback.format_exc())
+                self._publish(sse_frame('error', json.dumps({'error': str(e)}).encode()))
+            self._stop.wait(self.poll_interval)
+
+    def _on_batches(self, ring, batch_ids):
+        """Publishes batch and vitals events (under ring.lock); returns the prediction input."""
+        for batch_id in batch_ids:
+            self.last_id = batch_id
+            self.batches += 1
+            view = ring.view(*ring.batches[batch_id])
+            frame = sse_frame('batch', json.dumps(stream_item(view)).encode(), encode_cursor(batch_id))
+            with self._lock:
+                self.batch_frames.append((batch_id, frame))
+            self._publish(frame)
+
+        # Vitals and prediction once per read, over the latest window
+        _, signal = ring.last_batches(self.window)
+        frame = sse_frame('vitals', json.dumps(vitals_from_signal(signal)).encode())
+        with self._lock:
+            self.latest['vitals'] = frame
+        self._publish(frame)
+        # Resampled copy, so the predict call does not hold the ring
+        return prediction_input(signal) if self.predict else None
+
+    def _predict(self, signal):
+        try:
+            response = predict_client.post(*encode_predict_body(signal, PREDICT_WIRE_FORMAT))
+        except Exception as e:
+            print('Sensor feed prediction failed:', e)
+            return
+        if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('application/json'):
+            return
+        # Same body as /api/realtime/predict, so the dashboard reads both the same way
+        frame = sse_frame('prediction', wrap_prediction(response.content))
+        with self._lock:
+            self.latest['prediction'] = frame
+        self._publish(frame)
+
+    def stats(self):
+        with self._lock:
+            viewers = len(self.subscribers)
+        return {
+            'device': self.device,
+            'viewers': viewers,
+            'cursor': encode_cursor(self.last_id) if self.last_id is not None else None,
+            'batches': self.batches,
+            'polls': self.polls,
+        }
+
+class SensorFeedHub:
+    """One SensorFeed per device, started by its first viewer and stopped after its last."""
+
+    def __init__(self, feed_factory=SensorFeed):
+        self.feed_factory = feed_factory
+        self._feeds = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, device, subscriber, after_id=None):
+        with self._lock:
+            feed = self._feeds.get(device)
+            if feed is None or feed.stopped:
+                feed = self._feeds[device] = self.feed_factory(device).start()
+            feed.add(subscriber, after_id)
+        return feed
+
+    def unsubscribe(self, device, subscriber):
+        with self._lock:
+            feed = self._feeds.get(device)
+            if feed is not None and feed.remove(subscriber) == 0:
+                feed.stop()
+                del self._feeds[device]
+
+    def stats(self):
+        with self._lock:
+            feeds = list(self._feeds.values())
+        return {'feeds': [feed.stats() for feed in feeds]}
+
+sensor_feeds = SensorFeedHub()
+
+mongo_stream_bp = Blueprint('mongo_stream', __name__)
+
+@mongo_stream_bp.record_once
+def create_device_index(state):
+    """Creates the device index when the blueprint is registered, off the request and feed threads."""
+    threading.Thread(target=lambda: ensure_device_index(shared_sensors_db()['sensors']),
+                     name='sensors-device-index', daemon=True).start()
+
+@mongo_stream_bp.route('/api/mongo/stream', methods=['GET'])
+def mongo_stream():
+    sensors_db = get_sensors_db()
+    if sensors_db is None or 'sensors' not in sensors_db.list_collection_names():
+        return jsonify({'error': 'MongoDB sensors collection not available'}), 500
+
+    count = int(request.args.get('count', 10))
+    try:
+        query, start = page_query(request.args)
+        max_points = parse_max_points(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page = ring_request(sensors_db['sensors'], request.args, lambda ring, after_id: stream_page(ring, after_id, count, max_points))
+    if page is not None:
+        response = jsonify(page[0])
+        response.headers['X-Next-Cursor'] = page[1]
+        return response
+    docs = list(sensors_db['sensors'].find(query).sort('_id', 1).skip(start).limit(count))
+    response = jsonify(stream_results(docs, max_points))
+    response.headers['X-Next-Cursor'] = next_cursor(docs, request.args)
+    return response
+
+@mongo_stream_bp.route('/api/mongo/vitals', methods=['GET'])
+def mongo_vitals():
+    sensors_db = get_sensors_db()
+    if sensors_db is None or 'sensors' not in sensors_db.list_collection_names():
+        return jsonify({'error': 'MongoDB sensors collection not available'}), 500
+
+    window = int(request.args.get('window', 10))
+    try:
+        query, start = page_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page = ring_request(sensors_db['sensors'], request.args, lambda ring, after_id: vitals_page(ring, after_id, window))
+    if page is not None:
+        response = jsonify(page[0])
+        response.headers['X-Next-Cursor'] = page[1]
+        return response
+    docs = list(sensors_db['sensors'].find(query).sort('_id', 1).skip(start).limit(window))
+    response = jsonify(vitals_from_docs(docs))
+    response.headers['X-Next-Cursor'] = next_cursor(docs, request.args)
+    return response
+
+@mongo_stream_bp.route('/api/mongo/events', methods=['GET'])
+def mongo_events():
+    """
+    Server-sent events for one device (?device=, all sensors when empty):
+    `batch` for each new sensor batch, `vitals` and `prediction` when they change.
+    A reconnect carrying Last-Event-ID resumes after that batch instead of replaying the window.
+    """
+    device = request.args.get('device', '')
+    subscriber = Subscriber()
+    sensor_feeds.subscribe(device, subscriber, last_event_id(request.headers))
+
+    def events():
+        try:
+            while True:
+                try:
+                    frame = subscriber.queue.get(timeout=SSE_KEEPALIVE_S)
+                except queue.Empty:
+                    # Also how a closed connection is noticed when the device is quiet
+                    frame = KEEPALIVE_FRAME
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            sensor_feeds.unsubscribe(device, subscriber)
+
+    return Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@mongo_stream_bp.route('/api/mongo/events/stats', methods=['GET'])
+def mongo_events_stats():
+    return jsonify(sensor_feeds.stats())
+
+@mongo_stream_bp.route('/api/mongo/buffers', methods=['GET'])
+def mongo_buffers_stats():
+    return jsonify(sample_buffers.stats())
@@ -1,26 +1,43 @@
-from flask import Blueprint, request, jsonify
-import os
+from flask import Blueprint, request, jsonify, Response
 import requests
+from predict_client import predict_client, CircuitOpen, PREDICT_WIRE_FORMAT, wrap_prediction
+from ecg_format import encode_predict_body
+from routes.mongo_stream import latest_prediction_input
 
 realtime_bp = Blueprint('realtime', __name__)
 
+# Request headers that describe the body and are forwarded to the predict service
+FORWARDED_HEADERS = ('Content-Type', 'X-Shape', 'X-Dtype', 'X-Scale')
+
 @realtime_bp.route('/api/realtime/predict', methods=['GET', 'POST'])
 def realtime_predict():
     """
     Streams batches 10 by 10 from sensors collection and sends each group to the model API.
     Returns a list of predictions for each group.
-    Query params: patient_id (optional)
+    Query params: device (optional, GET without a body)
+
+    The body ({"ecg": [...]} JSON, application/x-npy, or raw samples with
+    X-Shape/X-Dtype) is forwarded without being parsed. A GET without a body
+    predicts on the last batches of the device's in-memory sample ring.
     """
-    req_data = request.get_json()
-    ecg_data = req_data.get('ecg')
-    if not ecg_data:
+    body = request.get_data()
+    headers = {k: v for k, v in request.headers.items() if k in FORWARDED_HEADERS}
+    if not body and request.method == 'GET':
+        # GET ?device=: predict on the last window of the device's sample ring
+        try:
+            signal = latest_prediction_input(request.args.get('device', ''))
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+        if signal is not None:
+            body, headers = encode_predict_body(signal, PREDICT_WIRE_FORMAT)
+    if not body:
         return jsonify({"success": False, "error": "Missing 'ecg' data in request."}), 400
-    predict_url = os.getenv("PREDICT_URL", "http://localhost:5001/predict")
     try:
-        response = requests.post(predict_url, json={"ecg": ecg_data})
-        result = response.json()
-        return jsonify({"success": True, "prediction": result}), response.status_code
-    except Exception as e:
+        response = predict_client.post(body, headers)
+    except CircuitOpen as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": str(int(e.retry_after))}
+    except requests.exceptions.RequestException as e:
         return jsonify({"success": False, "error": str(e)}), 500
-
-
+    if not response.headers.get('Content-Type', '').startswith('application/json'):
+        return jsonify({"success": False, "error": f"Unexpected predict service answer ({response.status_code})"}), 502
+    return Response(wrap_prediction(response.content), status=response.status_code, content_type='application/json')
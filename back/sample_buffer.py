@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+LEADS = 12
+LEAD_KEYS = tuple(f'lead{i}' for i in range(1, LEADS + 1))
+
+
+def batch_to_array(batch):
+    """(n_samples, 12) float array of a sensors `batch` list; missing leads are 0."""
+    return np.array([[float(sample.get(key, 0)) for key in LEAD_KEYS] for sample in batch],
+                    dtype=np.float64).reshape(-1, LEADS)
+
+
+class SampleRing:
+    """
+    Last `capacity` samples of one device in a preallocated array.
+
+    Every sample is written twice, at i and i + capacity of a (2 * capacity, 12)
+    array, so any run of the last `capacity` samples is one contiguous slice
+    and is handed out as a read-only view instead of a copy. Batch boundaries
+    are kept by sensors `_id`, so pages of whole batches map to slices.
+    Views are only valid until the next append: read them under `lock`.
+    """
+
+    def __init__(self, capacity, leads=LEADS):
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity, leads))
+        self.total = 0
+        self.batches = OrderedDict()  # _id -> (first sample, end sample), absolute indices
+        # _id of the last batch dropped from the front, None while nothing was dropped
+        self.anchor = None
+        self.last_id = None
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+
+    def append(self, doc_id, samples):
+        samples = np.asarray(samples)[-self.capacity:]
+        n = len(samples)
+        pos = self.total % self.capacity
+        head = min(n, self.capacity - pos)
+        for base in (0, self.capacity):
+            self._data[base + pos:base + pos + head] = samples[:head]
+            self._data[base:base + n - head] = samples[head:]
+        self.batches[doc_id] = (self.total, self.total + n)
+        self.total += n
+        self.last_id = doc_id
+        # Batches partly overwritten are forgotten; the last one dropped anchors the ring
+        while self.batches and next(iter(self.batches.values()))[0] < self.total - self.capacity:
+            self.anchor, _ = self.batches.popitem(last=False)
+
+    def view(self, start, end):
+        """Samples [start, end) by absolute index as a read-only view, None if no longer buffered."""
+        if start < self.total - self.capacity or end > self.total or start > end:
+            return None
+        offset = start % self.capacity
+        window = self._data[offset:offset + end - start]
+        window.flags.writeable = False
+        return window
+
+    def batches_after(self, doc_id, count):
+        """
+        Up to `count` buffered batches following `doc_id`.
+        Returns:
+            [(_id, samples view), ...], or None when `doc_id` is not the anchor or a buffered batch
+        """
+        ids = list(self.batches)
+        if self.anchor is not None and doc_id == self.anchor:
+            following = ids[:count]
+        elif doc_id in self.batches:
+            following = ids[ids.index(doc_id) + 1:][:count]
+        else:
+            return None
+        return [(i, self.view(*self.batches[i])) for i in following]
+
+    def window(self, batch_ids):
+        """One view over consecutive buffered batches."""
+        if not batch_ids:
+            return self._data[:0]
+        return self.view(self.batches[batch_ids[0]][0], self.batches[batch_ids[-1]][1])
+
+    def last_batches(self, count):
+        """(_ids, view) of the last `count` buffered batches."""
+        ids = list(self.batches)[-count:]
+        return ids, self.window(ids)
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+
+class SampleBufferStore:
+    """
+    Process-wide per-device SampleRings.
+
+    At most `max_devices` rings are kept (least recently used dropped first)
+    and a ring untouched for `idle_s` seconds is dropped on the next access.
+    """
+
+    def __init__(self, capacity=30000, max_devices=32, idle_s=300.0):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.idle_s = idle_s
+        self._rings = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, device):
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, ring in self._rings.items() if now - ring.last_used > self.idle_s]:
+                del self._rings[key]
+                self.evictions += 1
+            ring = self._rings.get(device)
+            if ring is None:
+                ring = self._rings[device] = SampleRing(self.capacity)
+                while len(self._rings) > self.max_devices:
+                    self._rings.popitem(last=False)
+                    self.evictions += 1
+            self._rings.move_to_end(device)
+            ring.last_used = now
+            return ring
+
+    def stats(self):
+        with self._lock:
+            rings = dict(self._rings)
+            evictions = self.evictions
+        return {
+            'devices': [
+                {'device': device, 'samples': min(ring.total, ring.capacity), 'batches': len(ring.batches)}
+                for device, ring in rings.items()
+            ],
+            'capacity': self.capacity,
+            'bytes': sum(ring.nbytes for ring in rings.values()),
+            'max_devices': self.max_devices,
+            'evictions': evictions,
+        }
+
+
+sample_buffers = SampleBufferStore(
+    capacity=int(os.getenv('SAMPLE_BUFFER_CAPACITY', 30000)),
+    max_devices=int(os.getenv('SAMPLE_BUFFER_MAX_DEVICES', 32)),
+    idle_s=float(os.getenv('SAMPLE_BUFFER_IDLE_S', 300)),
+)
@@ -0,0 +1,153 @@
+import json
+import os
+import sys
+import queue
+import numpy as np
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import routes.mongo_stream as mongo_stream
+from routes.mongo_stream import (SensorFeed, Subscriber, encode_cursor, ring_request, stream_page,
+                                 stream_results)
+from sample_buffer import SampleBufferStore, SampleRing
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeSensors:
+    """Just enough of a pymongo collection for the `_id` range reads of the sample ring."""
+
+    def __init__(self, n_docs, samples=5):
+        self.docs = [{'_id': ObjectId(), 'batch': [{'lead1': float(i), 'lead2': float(-i)}] * samples}
+                     for i in range(n_docs)]
+
+    def find(self, query, projection=None):
+        after = query.get('_id', {}).get('$gt')
+        return FakeCursor([d for d in self.docs if after is None or d['_id'] > after])
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+
+def drain(subscriber, timeout=0.5):
+    frames = []
+    while True:
+        try:
+            frames.append(subscriber.queue.get(timeout=timeout))
+        except queue.Empty:
+            return frames
+
+
+def batch_ids(frames):
+    return [frame.split(b'\n')[1][len(b'id: '):].decode() for frame in frames if frame.startswith(b'event: batch')]
+
+
+def fresh_buffers(monkeypatch, capacity=1000):
+    buffers = SampleBufferStore(capacity=capacity)
+    monkeypatch.setattr(mongo_stream, 'sample_buffers', buffers)
+    return buffers
+
+
+def test_ring_wraps_into_contiguous_views():
+    ring = SampleRing(capacity=8, leads=1)
+    for i in range(5):
+        ring.append(i, np.full((3, 1), float(i)))
+    # 15 samples in 8 slots: batches 0-2 were overwritten, 3 and 4 are whole
+    assert list(ring.batches) == [3, 4]
+    assert ring.anchor == 2
+    ids, view = ring.last_batches(2)
+    assert ids == [3, 4]
+    assert view[:, 0].tolist() == [3.0] * 3 + [4.0] * 3
+    assert not view.flags.writeable
+    assert [i for i, _ in ring.batches_after(2, 10)] == [3, 4]
+    assert ring.batches_after(0, 10) is None
+
+
+def test_cursor_page_behind_the_ring_does_not_move_it(monkeypatch):
+    buffers = fresh_buffers(monkeypatch)
+    sensors = FakeSensors(200)
+    old_cursor = {'after': encode_cursor(sensors.docs[5]['_id'])}
+
+    # An old cursor on an empty ring is not served from it; the route falls back to Mongo
+    assert ring_request(sensors, old_cursor, lambda ring, after_id: stream_page(ring, after_id, 10)) is None
+    ring = buffers.get('')
+    assert ring.last_id == sensors.docs[-1]['_id']
+    assert list(ring.batches) == [d['_id'] for d in sensors.docs[-mongo_stream.SSE_WINDOW:]]
+    assert ring.anchor is None
+
+    # A cursor inside the ring is served from it, and leaves it where it was
+    in_ring = {'after': encode_cursor(sensors.docs[-4]['_id'])}
+    body, cursor = ring_request(sensors, in_ring, lambda ring, after_id: stream_page(ring, after_id, 10))
+    assert body == stream_results(sensors.docs[-3:])
+    assert cursor == encode_cursor(sensors.docs[-1]['_id'])
+    assert list(ring.batches) == [d['_id'] for d in sensors.docs[-mongo_stream.SSE_WINDOW:]]
+
+
+def test_feed_after_history_page_only_publishes_the_live_window(monkeypatch):
+    fresh_buffers(monkeypatch)
+    # More history after the cursor than one ring sync reads
+    sensors = FakeSensors(10 * mongo_stream.SAMPLE_BUFFER_SYNC_BATCHES)
+    ring_request(sensors, {'after': encode_cursor(sensors.docs[5]['_id'])},
+                 lambda ring, after_id: stream_page(ring, after_id, 10))
+
+    feed = SensorFeed('', collection_fn=lambda: sensors, poll_interval=0.05, predict=False)
+    subscriber = Subscriber()
+    feed.add(subscriber)
+    feed.start()
+    try:
+        # Only the latest window, not the historical batches after the old cursor
+        assert batch_ids(drain(subscriber)) == [encode_cursor(d['_id']) for d in sensors.docs[-mongo_stream.SSE_WINDOW:]]
+        assert feed.batches == mongo_stream.SSE_WINDOW
+
+        # New documents are then published as they arrive
+        sensors.docs.append({'_id': ObjectId(), 'batch': [{'lead1': 1.0}] * 5})
+        assert batch_ids(drain(subscriber)) == [encode_cursor(sensors.docs[-1]['_id'])]
+    finally:
+        feed.stop()
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {'Content-Type': 'application/json'}
+    content = b'{"prediction": 1, "class": "MI"}'
+
+
+def frame_data(frame):
+    return json.loads(b''.join(line[len(b'data: '):] for line in frame.split(b'\n') if line.startswith(b'data: ')))
+
+
+def test_feed_prediction_has_the_realtime_predict_shape(monkeypatch):
+    fresh_buffers(monkeypatch)
+    sensors = FakeSensors(mongo_stream.SSE_WINDOW)
+    monkeypatch.setattr(mongo_stream.predict_client, 'post', lambda *args, **kwargs: FakeResponse())
+
+    feed = SensorFeed('', collection_fn=lambda: sensors, poll_interval=0.05)
+    subscriber = Subscriber()
+    feed.add(subscriber)
+    feed.start()
+    try:
+        predictions = [f for f in drain(subscriber) if f.startswith(b'event: prediction')]
+    finally:
+        feed.stop()
+    # Same body as /api/realtime/predict: the predict answer under "prediction"
+    assert predictions
+    assert frame_data(predictions[0]) == {'success': True, 'prediction': {'prediction': 1, 'class': 'MI'}}
@@ -0,0 +1,117 @@
+import os
+import numpy as np
+import wfdb
+
+# WFDB format 16 marks missing samples with the smallest int16 value
+INVALID_FMT16 = -32768
+
+
+class RecordWindow:
+    """A window of a WFDB record, in digital units plus the header calibration."""
+
+    def __init__(self, digital, gains, baselines, fs, start, sig_name, units, sig_len):
+        self.digital = digital
+        self.gains = gains
+        self.baselines = baselines
+        self.fs = fs
+        self.start = start
+        self.sig_name = sig_name
+        self.units = units
+        self.sig_len = sig_len
+
+    def physical(self, dtype=np.float64):
+        """Convert to physical units: (digital - baseline) / gain, invalid samples become NaN."""
+        values = (self.digital.astype(dtype) - self.baselines.astype(dtype)) / self.gains.astype(dtype)
+        if self.digital.dtype == np.int16:
+            values[self.digital == INVALID_FMT16] = np.nan
+        return values
+
+    def fields(self):
+        """Same keys as the fields dict returned by wfdb.rdsamp."""
+        return {
+            'fs': self.fs,
+            'sig_len': self.digital.shape[0],
+            'n_sig': self.digital.shape[1],
+            'sig_name': self.sig_name,
+            'units': self.units,
+        }
+
+
+def parse_window(args):
+    """
+    Read ?start= (seconds), ?duration= (seconds) and ?leads= (comma-separated
+    lead numbers, 1-based like the leadN keys) from the query string.
+    Returns:
+        (start_s, duration_s, lead indices) or None when no window is requested
+    Raises:
+        ValueError: on malformed values
+    """
+    if not any(k in args for k in ('start', 'duration', 'leads')):
+        return None
+    start_s = float(args.get('start', 0))
+    duration_s = float(args['duration']) if args.get('duration') else None
+    if start_s < 0 or (duration_s is not None and duration_s <= 0):
+        raise ValueError('start must be >= 0 and duration > 0')
+    leads = None
+    if args.get('leads'):
+        leads = [int(x) - 1 for x in args['leads'].split(',') if x.strip()]
+    return start_s, duration_s, leads
+
+
+def _is_fmt16_single_file(header):
+    file_names = set(header.file_name or [])
+    return (
+        len(file_names) == 1
+        and all(f == '16' for f in header.fmt)
+        and all((s or 1) == 1 for s in (header.samps_per_frame or [1]))
+        and not any(header.skew or [])
+        and len(set(header.byte_offset or [None])) == 1
+    )
+
+
+def read_window(record_path, start=0.0, duration=None, leads=None):
+    """
+    Read part of a WFDB record without decoding the whole file.
+
+    Format-16 records stored in a single .dat file are opened with np.memmap,
+    so only the pages covering [start, start + duration) are touched. Other
+    formats fall back to wfdb.rdrecord with sampfrom/sampto/channels.
+    Args:
+        record_path: record path without extension
+        start: window start in seconds
+        duration: window length in seconds (None for the rest of the record)
+        leads: list of 0-based channel indices (None for all)
+    Returns:
+        RecordWindow
+    Raises:
+        ValueError: when the window or the channel selection is out of range
+    """
+    header = wfdb.rdheader(record_path)
+    fs = header.fs
+    sig_len = header.sig_len
+    n_sig = header.n_sig
+
+    start = int(round(start * fs))
+    if start < 0 or start >= sig_len:
+        raise ValueError(f'start is past the end of the record ({sig_len / fs:.2f} s)')
+    stop = sig_len if duration is None else min(sig_len, start + max(1, int(round(duration * fs))))
+    channels = list(range(n_sig)) if leads is None else list(leads)
+    if not channels or any(c < 0 or c >= n_sig for c in channels):
+        raise ValueError(f'lead out of range (record has {n_sig} leads)')
+
+    gains = np.array([header.adc_gain[c] or 200.0 for c in channels], dtype=np.float64)
+    baselines = np.array([header.baseline[c] or 0 for c in channels], dtype=np.int64)
+    sig_name = [header.sig_name[c] for c in channels]
+    units = [header.units[c] for c in channels]
+
+    if _is_fmt16_single_file(header):
+        dat_path = os.path.join(os.path.dirname(record_path), header.file_name[0])
+        offset = header.byte_offset[0] or 0
+        mapped = np.memmap(dat_path, dtype='<i2', mode='r', offset=offset, shape=(sig_len, n_sig))
+        digital = np.array(mapped[start:stop, channels])
+        del mapped
+    else:
+        record = wfdb.rdrecord(record_path, sampfrom=start, sampto=stop, channels=channels, physical=False)
+        digital = record.d_signal
+
+    return RecordWindow(digital, gains, baselines, fs, start, sig_name, units, sig_len)
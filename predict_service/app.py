@@ -1,14 +1,49 @@
-from flask import Flask, request, jsonify
+from startup import phase, ServiceLoader, ServiceNotReady
+with phase('import flask'):
+    from flask import Flask, request, jsonify
 import numpy as np
 import os
 import tempfile
 
-from test import ECGSingleFileProcessor, analyser_fichier_ecg_unique
+from ingest import read_batch, read_tensor, is_tensor_body
+from batching import MicroBatcher
+from registry import registry
+from model_routes import models_bp
+from worker_pool import ModelWorkerPool
+from inference import INFERENCE_BACKEND
 
 app = Flask(__name__)
+app.register_blueprint(models_bp)
 
-MODEL_PATH = "best_ecg_hybrid_model.h5"
-processor = ECGSingleFileProcessor(MODEL_PATH)
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 256))
+# 'threads' (model in this process) or 'workers' (requests handed to ModelWorkerPool processes)
+SERVING_MODE = os.environ.get('SERVING_MODE', 'threads')
+
+
+def load_processor(phase):
+    if SERVING_MODE == 'workers':
+        with phase('start model workers'):
+            return ModelWorkerPool(models=('hf',)).start()
+    # TensorFlow and the model load in the background; routes wait on loader.get()
+    if INFERENCE_BACKEND != 'tflite':
+        # The TFLite backend only imports TensorFlow if its exported model is missing
+        with phase('import tensorflow'):
+            import tensorflow
+    with phase('import test'):
+        from test import ECGSingleFileProcessor
+    with phase('load model'):
+        return registry.get('hf')
+
+
+loader = ServiceLoader(load_processor).start()
+
+# Concurrent JSON /predict calls share model.predict through the micro-batcher
+MICRO_BATCHING = os.environ.get('MICRO_BATCHING', '1') == '1' and SERVING_MODE != 'workers'
+batcher = MicroBatcher(
+    lambda arrays: registry.get('hf').predict_batch_from_arrays(arrays),
+    max_batch_size=int(os.environ.get('BATCH_MAX_SIZE', 32)),
+    max_wait_ms=float(os.environ.get('BATCH_MAX_WAIT_MS', 2)),
+) if MICRO_BATCHING else None
 
 def convert_numpy_types(obj):
     if isinstance(obj, dict):
@@ -22,19 +57,51 @@ def convert_numpy_types(obj):
     else:
         return obj
 
+def not_ready(e):
+    response = jsonify({'success': False, 'error': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    status = loader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    # Case 1: Array input via JSON
-    if request.is_json:
-        data = request.get_json()
-        array = data.get('array') if isinstance(data, dict) else None
-        if array is None and isinstance(data, dict):
-            array = data.get('ecg')
-        if array is None:
-            return jsonify({'success': False, 'error': 'No array provided in JSON.'}), 400
+    try:
+        service = loader.get()
+    except ServiceNotReady as e:
+        return not_ready(e)
+    pool = service if SERVING_MODE == 'workers' else None
+    processor = registry.get('hf') if pool is None else None
+
+    # Case 1: Array input via JSON, or as an application/x-npy / raw (X-Shape, X-Dtype) body
+    if request.is_json or is_tensor_body(request):
+        if request.is_json:
+            data = request.get_json()
+            array = data.get('array') if isinstance(data, dict) else None
+            if array is None and isinstance(data, dict):
+                array = data.get('ecg')
+            if array is None:
+                return jsonify({'success': False, 'error': 'No array provided in JSON.'}), 400
+        else:
+            try:
+                array = read_tensor(request)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
         try:
             np_array = np.array(array, dtype=np.float64)
-            result = processor.predict_from_array(np_array)
+            if pool is not None:
+                result = pool.call('hf.predict', np_array)
+            elif batcher is not None:
+                result = batcher(np_array)
+            else:
+                result = processor.predict_from_array(np_array)
             result = convert_numpy_types(result)
             return jsonify(result)
         except Exception as e:
@@ -66,7 +133,11 @@ def predict():
 
             # Remove extension for chemin_base
             chemin_base = dat_path[:-4]
-            result = analyser_fichier_ecg_unique(chemin_base, model_path=MODEL_PATH)
+            # Processeur partagé du registre, sans recharger le modèle
+            if pool is not None:
+                result = pool.call('hf.file', chemin_base)
+            else:
+                result = processor.analyser_fichier_complet(chemin_base)
             # Remove numpy arrays from result for JSON serialization
             if 'signal_preprocessed' in result:
                 result.pop('signal_preprocessed')
@@ -75,6 +146,45 @@ def predict():
 
     return jsonify({'success': False, 'error': 'No valid input provided.'}), 400
 
+@app.route('/metrics/batching')
+def batching_metrics():
+    if batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(enabled=True, **batcher.stats()))
+
+@app.route('/metrics/workers')
+def worker_metrics():
+    if SERVING_MODE != 'workers' or not loader.ready:
+        return jsonify({'enabled': SERVING_MODE == 'workers', 'ready': False})
+    return jsonify(dict(enabled=True, **loader.value.stats()))
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    # JSON {"signals": [[...], ...]} or an application/x-npy (n, samples) array
+    try:
+        arrays = read_batch(request)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not arrays:
+        return jsonify({'success': False, 'error': 'No signals provided.'}), 400
+    if len(arrays) > MAX_BATCH_SIZE:
+        return jsonify({'success': False, 'error': f'Batch larger than {MAX_BATCH_SIZE} signals.'}), 413
+
+    try:
+        service = loader.get()
+    except ServiceNotReady as e:
+        return not_ready(e)
+
+    try:
+        if SERVING_MODE == 'workers':
+            results = service.call('hf.batch', arrays)
+        else:
+            results = registry.get('hf').predict_batch_from_arrays(arrays)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    results = [dict(index=i, success='error' not in r, **r) for i, r in enumerate(results)]
+    return jsonify({'success': True, 'results': convert_numpy_types(results)})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+# Upper bounds (ms) of the queue-wait histogram buckets; the last bucket is open
+WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes d'inférence concurrentes en un seul appel batché
+
+    Les éléments soumis sont mis en file; un thread unique les vide dès que
+    `max_batch_size` éléments sont disponibles ou que le plus ancien a attendu
+    `max_wait_ms`, appelle `batch_fn(items)` une fois et rend à chaque
+    appelant son propre résultat via un Future.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 32, max_wait_ms: float = 2.0, name: str = 'micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._wait_histogram = Counter()
+        self._items = 0
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def __call__(self, item, timeout: float = None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(block=remaining > 0, timeout=remaining if remaining > 0 else None))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"batch_fn returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            for _, _, submitted in batch:
+                wait_ms = (started - submitted) * 1000.0
+                bucket = next((b for b in WAIT_BUCKETS_MS if wait_ms <= b), 'inf')
+                self._wait_histogram[bucket] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'items': self._items,
+                'mean_batch_size': (self._items / self._batches) if self._batches else None,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'queue_wait_ms_histogram': {
+                    f'le_{b}': self._wait_histogram.get(b, 0) for b in WAIT_BUCKETS_MS + ('inf',)
+                },
+            }
@@ -0,0 +1,288 @@
+import numpy as np
+from functools import lru_cache
+from scipy import interpolate, ndimage, signal
+
+# Délinéateur NumPy/SciPy: même contrat que lead_processing.return_peaks,
+# mais les 12 dérivations sont nettoyées et délinéées ensemble. T, début et fin
+# du QRS suivent l'algorithme en ondelettes de nk.ecg_delineate(method="dwt"),
+# Q celui de method="peak", sans les DataFrames par battement de neurokit.
+
+SAMPLING_RATE = 500
+
+
+@lru_cache(maxsize=8)
+def _clean_filters(sampling_rate):
+    # Identique à nk.ecg_clean(method="neurokit"): passe-haut 0.5 Hz d'ordre 5 puis moyenne glissante 50 Hz
+    sos_high = signal.butter(5, 0.5, btype='highpass', output='sos', fs=sampling_rate)
+    powerline = np.ones(int(sampling_rate / 50) if sampling_rate >= 100 else 2)
+    return sos_high, powerline
+
+
+def clean_leads(leads, sampling_rate=SAMPLING_RATE):
+    """
+    Nettoie toutes les dérivations en une passe
+
+    Args:
+        leads: Tableau (n_leads, n_samples)
+
+    Returns:
+        Dérivations nettoyées, même forme
+    """
+    sos_high, powerline = _clean_filters(sampling_rate)
+    cleaned = signal.sosfiltfilt(sos_high, leads, axis=-1)
+    return signal.filtfilt(powerline, [len(powerline)], cleaned, axis=-1, method='pad')
+
+
+def detect_rpeaks(cleaned, sampling_rate=SAMPLING_RATE):
+    """
+    Détecte les pics R de chaque dérivation (dérivée, carré, moyenne glissante, puis recentrage)
+
+    Args:
+        cleaned: Tableau (n_leads, n_samples) nettoyé
+
+    Returns:
+        Liste d'indices de pics R par dérivation
+    """
+    diff = np.diff(cleaned, axis=-1, prepend=cleaned[:, :1])
+    width = max(1, int(0.12 * sampling_rate))
+    energy = signal.lfilter(np.ones(width) / width, [1.0], diff * diff, axis=-1)
+    # Le filtre causal décale l'enveloppe d'une demi-fenêtre
+    energy = np.roll(energy, -(width // 2), axis=-1)
+
+    distance = max(1, int(0.3 * sampling_rate))
+    thresholds = 0.3 * np.percentile(energy, 99, axis=-1)
+
+    rpeaks = []
+    for lead, env, threshold in zip(cleaned, energy, thresholds):
+        candidates, _ = signal.find_peaks(env, height=threshold, distance=distance)
+        if candidates.size == 0:
+            rpeaks.append(candidates)
+            continue
+        rpeaks.append(np.unique(refine_rpeaks(lead, candidates, sampling_rate)))
+    return rpeaks
+
+
+def refine_rpeaks(lead, rpeaks, sampling_rate=SAMPLING_RATE, tol=0.05):
+    """
+    Recentre des pics R sur le maximum de la dérivation dans ±tol secondes (comme ecg.correct_rpeaks)
+
+    Args:
+        lead: Dérivation nettoyée
+        rpeaks: Indices approximatifs des pics R
+
+    Returns:
+        Indices recentrés, un par pic d'entrée et dans le même ordre
+    """
+    rpeaks = np.asarray(rpeaks, dtype=np.int64)
+    if rpeaks.size == 0:
+        return rpeaks
+    offsets = np.arange(-int(tol * sampling_rate), int(tol * sampling_rate) + 1)
+    windows = np.clip(rpeaks[:, None] + offsets, 0, lead.shape[0] - 1)
+    return windows[np.arange(len(rpeaks)), np.argmax(lead[windows], axis=1)]
+
+
+# Analyse en ondelettes à 2000 Hz, comme nk.ecg_delineate(method="dwt")
+ANALYSIS_RATE = 2000
+DWT_DEGREES = 9
+
+
+def resample_leads(leads, sampling_rate=SAMPLING_RATE, analysis_rate=ANALYSIS_RATE):
+    """
+    Rééchantillonne chaque dérivation à la fréquence d'analyse (spline cubique, comme nk.signal_resample)
+    """
+    length = int(np.round(leads.shape[-1] * analysis_rate / sampling_rate))
+    return np.stack([ndimage.zoom(lead, length / lead.shape[0]) for lead in leads])
+
+
+def dwt_multiscales(leads, max_degree=DWT_DEGREES):
+    """
+    Transformée en ondelettes à trous de toutes les dérivations (filtres de Martínez et al. 2004)
+
+    Args:
+        leads: Tableau (n_leads, n_samples) à la fréquence d'analyse
+
+    Returns:
+        Tableau (n_leads, max_degree, n_samples)
+    """
+    n_samples = leads.shape[-1]
+    scales = []
+    current = leads
+    for degree in range(max_degree):
+        delay = 2 ** degree
+        zeros = np.zeros(delay - 1)
+        high = np.r_[2.0, zeros, -2.0]
+        low = np.r_[1.0 / 8, zeros, 3.0 / 8, zeros, 3.0 / 8, zeros, 1.0 / 8]
+        detail = signal.convolve(current, high[np.newaxis, :], mode='full')
+        smooth = signal.convolve(current, low[np.newaxis, :], mode='full')
+        # Compensation du retard des filtres, la fin du signal lissé reste telle quelle
+        detail[:, :-delay] = detail[:, delay:]
+        smooth[:, :-delay] = smooth[:, delay:]
+        scales.append(detail[:, :n_samples])
+        current = smooth
+    return np.stack(scales, axis=1)
+
+
+def _median_rate(rpeaks, sampling_rate):
+    period = np.ediff1d(rpeaks, to_begin=0) / sampling_rate
+    period[0] = np.mean(period[1:])
+    return np.median(60.0 / period)
+
+
+def _mean_rate(rpeaks, sampling_rate, n_samples):
+    # Fréquence interpolée sur tout le signal (monotone cubique, bornes constantes), comme ecg_segment
+    period = np.ediff1d(rpeaks, to_begin=0) / sampling_rate
+    period[0] = np.mean(period[1:])
+    x_new = np.clip(np.arange(n_samples), rpeaks[0], rpeaks[-1])
+    return np.mean(60.0 / interpolate.PchipInterpolator(rpeaks, period)(x_new))
+
+
+def _first_zero_crossing(values):
+    return np.nonzero(np.diff(np.sign(values)))[0][0]
+
+
+def _tp_peak(ecg, dwt, start, end, epsilon_weight, score):
+    # Onde T ou P: passage à zéro entre un maximum et un minimum du détail, choisi par `score`
+    local = dwt[start:end]
+    if len(local) == 0:
+        return np.nan
+    height = epsilon_weight * np.sqrt(np.mean(np.square(local)))
+    peaks, _ = signal.find_peaks(np.abs(local), height=height)
+    peaks = [p for p in peaks if np.abs(local[p]) > 0.025 * max(local)]
+    if local[0] > 0:
+        peaks = [0] + peaks
+    best, best_score = np.nan, -np.inf
+    for peak, peak_next in zip(peaks[:-1], peaks[1:]):
+        if local[peak] > 0 and local[peak_next] < 0:
+            zero = _first_zero_crossing(local[peak:peak_next + 1]) + peak
+            value = score(ecg[start:end][zero], zero)
+            if value > best_score:
+                best, best_score = zero + start, value
+    return best
+
+
+def _qrs_onset(dwt, start, end):
+    if np.isnan(start) or np.isnan(end):
+        return np.nan
+    local = -dwt[int(start):int(end)]
+    slopes, _ = signal.find_peaks(local)
+    if len(slopes) == 0:
+        return np.nan
+    candidates = np.nonzero(local[:slopes[-1]] < 0.5 * local[slopes[-1]])[0]
+    return candidates[-1] + int(start) if len(candidates) else np.nan
+
+
+def _qrs_offset(dwt, start, end):
+    if np.isnan(start) or np.isnan(end):
+        return np.nan
+    local = dwt[int(start):int(end)]
+    slopes, _ = signal.find_peaks(local)
+    if len(slopes) == 0:
+        return np.nan
+    candidates = np.nonzero(local[slopes[0]:] < 0.5 * local[slopes[0]])[0]
+    return candidates[0] + slopes[0] + int(start) if len(candidates) else np.nan
+
+
+def _q_peaks(lead, rpeaks, sampling_rate):
+    """
+    Ondes Q comme nk.ecg_delineate(method="peak"): dernier creux assez proéminent avant R
+    """
+    n_samples = lead.shape[0]
+    pre = -0.35 * 60.0 / _mean_rate(rpeaks, sampling_rate, n_samples)
+    q_peaks = np.full(len(rpeaks), np.nan)
+    for i, rpeak in enumerate(rpeaks):
+        start = rpeak + int(np.floor(pre * sampling_rate))
+        segment = lead[max(start, 0):rpeak]
+        if len(segment) < 3:
+            continue
+        troughs, _ = signal.find_peaks(-segment, prominence=0.05 * (segment.max() - segment.min()))
+        if len(troughs):
+            q_peaks[i] = rpeak - (len(segment) - troughs[-1])
+    return q_peaks
+
+
+def delineate_lead(lead, rpeaks, sampling_rate=SAMPLING_RATE, dwt=None, resampled=None):
+    """
+    Délinée une dérivation à partir de ses pics R
+
+    Args:
+        lead: Dérivation nettoyée et centrée
+        rpeaks: Indices des pics R (sans le premier ni le dernier battement)
+        dwt, resampled: Détails (max_degree, n) et dérivation à ANALYSIS_RATE, calculés si None
+
+    Returns:
+        [T_peaks, R_onsets, R_offsets, Q_peaks] en tableaux float (NaN si absent)
+    """
+    rpeaks = np.asarray(rpeaks, dtype=np.int64)
+    if resampled is None:
+        resampled = resample_leads(lead[np.newaxis, :], sampling_rate)[0]
+    if dwt is None:
+        dwt = dwt_multiscales(resampled[np.newaxis, :])[0]
+    rate = ANALYSIS_RATE
+    scale = rate / sampling_rate
+    n_samples = lead.shape[0]
+
+    q_peaks = _q_peaks(lead, rpeaks, sampling_rate)
+    # Mêmes arrondis que _dwt_resample_points
+    r_hi = (rpeaks * scale).astype(np.int64)
+    q_hi = np.array([np.nan if np.isnan(q) else int(q * scale) for q in q_peaks])
+
+    heart_rate = _median_rate(r_hi, rate)
+    degree = int(np.log2((rate / 250) / (heart_rate / 60)))
+    p2r = np.round(0.2 * (60 / heart_rate), 3)
+    rt = np.round(0.25 * (60 / heart_rate), 3)
+    boundary = int(0.5 * 0.13 * rate)
+
+    t_dwt, p_dwt, qrs_dwt = dwt[3 + degree], dwt[2 + degree], dwt[2 + degree]
+    t_hi, p_hi = [], []
+    for r in r_hi:
+        t_hi.append(_tp_peak(resampled, t_dwt, r + boundary, r + 2 * int(rt * rate), 0.25,
+                             lambda value, zero: value - (zero / rate - (rt - 0.065))))
+        p_hi.append(_tp_peak(resampled, p_dwt, r - 2 * int(p2r * rate), r - boundary, 0.02,
+                             lambda value, zero: value - abs(zero / rate - p2r)))
+
+    r_onsets = [_qrs_onset(qrs_dwt, p, q) for p, q in zip(p_hi, q_hi)]
+    r_offsets = [_qrs_offset(qrs_dwt, r, t) for r, t in zip(r_hi, t_hi)]
+
+    def to_lead(points, scale=scale):
+        points = np.array([np.nan if np.isnan(x) else int(x / scale) for x in points], dtype=np.float64)
+        # Comme ecg_delineate: un dernier point hors du signal devient NaN
+        if len(points) and points[-1] >= n_samples:
+            points[-1] = np.nan
+        return points
+
+    return [to_lead(t_hi), to_lead(r_onsets), to_lead(r_offsets), to_lead(q_peaks, 1)]
+
+
+def fast_return_peaks(leads, sampling_rate=SAMPLING_RATE, rpeaks=None):
+    """
+    Équivalent vectorisé de return_peaks pour toutes les dérivations
+
+    Args:
+        leads: Tableau (n_leads, n_samples) déjà filtré par filter_data
+        rpeaks: Pics R communs (lead_processing.shared_rpeaks); détectés par dérivation si None
+
+    Returns:
+        Liste par dérivation de (signal nettoyé, [T, R_on, R_off, Q]) ou 'INCOMPLETE'
+    """
+    leads = np.atleast_2d(np.asarray(leads, dtype=np.float64))
+    cleaned = clean_leads(leads, sampling_rate)
+    # Équivalent de nk.signal_detrend(order=0)
+    cleaned = cleaned - cleaned.mean(axis=-1, keepdims=True)
+
+    # Rééchantillonnage et ondelettes calculés une fois pour les 12 dérivations
+    resampled = resample_leads(cleaned, sampling_rate)
+    dwt = dwt_multiscales(resampled)
+
+    if rpeaks is not None:
+        return [(lead, delineate_lead(lead, refine_rpeaks(lead, rpeaks, sampling_rate), sampling_rate,
+                                      dwt[i], resampled[i]))
+                for i, lead in enumerate(cleaned)]
+
+    results = []
+    for i, (lead, rdet) in enumerate(zip(cleaned, detect_rpeaks(cleaned, sampling_rate))):
+        if rdet.size <= 4:
+            results.append('INCOMPLETE')
+            continue
+        rdet = rdet[1:-1]
+        results.append((lead, delineate_lead(lead, rdet, sampling_rate, dwt[i], resampled[i])))
+    return results
@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+import numpy as np
+
+# TensorFlow n'est importé que par les chemins Keras (CompiledModel, load_predictor),
+# ou par TFLiteModel si tflite_runtime est absent
+
+# Chemin d'inférence compilé: 'true' (tf.function) ou 'false' (model.predict)
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', 'true').lower() == 'true'
+# Compilation XLA du graphe d'inférence
+XLA_JIT_COMPILE = os.environ.get('XLA_JIT_COMPILE', 'false').lower() == 'true'
+# Tailles de lot compilées; un lot est complété jusqu'au bucket supérieur
+INFERENCE_BUCKETS = tuple(sorted(int(b) for b in os.environ.get(
+    'INFERENCE_BUCKETS', '1,2,4,8,16,32,64,128,256').split(',') if b.strip()))
+# Écart maximal toléré avec model.predict lors de la vérification au démarrage
+INFERENCE_TOLERANCE = float(os.environ.get('INFERENCE_TOLERANCE', 1e-4))
+# Moteur d'inférence: 'keras' (CompiledModel ou model.predict) ou 'tflite'
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+# Variante TFLite servie: 'float32', 'float16' ou 'int8' (voir tflite_convert.py)
+TFLITE_VARIANT = os.environ.get('TFLITE_VARIANT', 'float32')
+TFLITE_DIR = os.environ.get('TFLITE_DIR', 'tflite')
+TFLITE_NUM_THREADS = int(os.environ.get('TFLITE_NUM_THREADS', 1))
+
+
+def tflite_interpreter_class():
+    """
+    Interpréteur TFLite: tflite_runtime s'il est installé, sinon tf.lite (importe TensorFlow)
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def bucket_for(n: int, buckets) -> int:
+    for bucket in buckets:
+        if n <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def predict_bucketed(x: np.ndarray, buckets, forward) -> np.ndarray:
+    """
+    Découpe x en morceaux de taille de bucket, complétés par des zéros
+
+    Args:
+        x: Tableau float32 (n, ...)
+        buckets: Tailles de lot autorisées, croissantes
+        forward: Fonction (tableau de taille bucket) -> sorties numpy
+
+    Returns:
+        Sorties des n entrées
+    """
+    n = x.shape[0]
+    outputs = []
+    start = 0
+    while start < n:
+        bucket = bucket_for(n - start, buckets)
+        chunk = x[start:start + bucket]
+        size = chunk.shape[0]
+        if size < bucket:
+            padding = np.zeros((bucket - size,) + chunk.shape[1:], dtype=np.float32)
+            chunk = np.concatenate([chunk, padding], axis=0)
+        outputs.append(forward(chunk)[:size])
+        start += size
+    return np.concatenate(outputs, axis=0)
+
+
+class CompiledModel:
+    """
+    Enveloppe d'inférence d'un modèle Keras à une entrée
+
+    Le passage avant est une tf.function à signature fixe (lot variable,
+    forme d'entrée du modèle, float32). Chaque appel est complété jusqu'à la
+    taille de bucket supérieure, donc seules les tailles de INFERENCE_BUCKETS
+    sont tracées/compilées, toutes pendant warmup(). Expose predict(x, verbose=0)
+    comme un modèle Keras.
+    """
+
+    def __init__(self, model, buckets=INFERENCE_BUCKETS, jit_compile: bool = XLA_JIT_COMPILE):
+        import tensorflow as tf
+        self._tf = tf
+        self.model = model
+        self.buckets = tuple(buckets)
+        self.jit_compile = jit_compile
+        self.input_shape = tuple(model.input_shape[1:])
+        self.warmup_seconds = None
+        self._forward = tf.function(
+            self._call,
+            input_signature=[tf.TensorSpec((None,) + self.input_shape, tf.float32)],
+            jit_compile=jit_compile,
+        )
+
+    def _call(self, x):
+        return self.model(x, training=False)
+
+    def predict(self, x, verbose: int = 0) -> np.ndarray:
+        """
+        Args:
+            x: Tableau (n, *input_shape)
+            verbose: Ignoré, pour la compatibilité avec model.predict
+
+        Returns:
+            Sorties du modèle pour les n entrées, en numpy
+        """
+        return predict_bucketed(np.asarray(x, dtype=np.float32), self.buckets,
+                                lambda chunk: self._forward(self._tf.convert_to_tensor(chunk)).numpy())
+
+    def warmup(self):
+        """
+        Trace chaque bucket puis vérifie l'écart avec model.predict
+
+        Returns:
+            Écart absolu maximal observé
+        """
+        started = time.perf_counter()
+        for bucket in self.buckets:
+            self._forward(self._tf.zeros((bucket,) + self.input_shape, dtype=self._tf.float32))
+
+        sample = np.random.default_rng(0).random((min(4, self.buckets[-1]),) + self.input_shape).astype(np.float32)
+        ecart = float(np.max(np.abs(self.predict(sample) - self.model.predict(sample, verbose=0))))
+        self.warmup_seconds = time.perf_counter() - started
+        print(f"Inférence compilée prête ({len(self.buckets)} buckets, XLA={self.jit_compile}) "
+              f"en {self.warmup_seconds:.2f} s, écart max {ecart:.2e}")
+        return ecart
+
+
+def compile_for_inference(model):
+    """
+    Renvoie le prédicteur à utiliser pour `model` selon la configuration
+
+    Args:
+        model: Modèle Keras chargé
+
+    Returns:
+        CompiledModel chauffé, ou le modèle Keras lui-même si COMPILED_INFERENCE est désactivé
+        ou si les sorties compilées s'écartent de model.predict au-delà de INFERENCE_TOLERANCE
+    """
+    if not COMPILED_INFERENCE:
+        return model
+    try:
+        compiled = CompiledModel(model)
+        ecart = compiled.warmup()
+    except Exception as e:
+        print(f"Inférence compilée indisponible, retour à model.predict: {e}")
+        return model
+    if not ecart <= INFERENCE_TOLERANCE:
+        print(f"Écart {ecart:.2e} supérieur à {INFERENCE_TOLERANCE:.0e}, retour à model.predict")
+        return model
+    return compiled
+
+
+class TFLiteModel:
+    """
+    Modèle TFLite exposant predict(x, verbose=0) comme un modèle Keras
+
+    Un interpréteur est alloué par taille de bucket à la première utilisation,
+    puis réutilisé; les appels sont sérialisés car un interpréteur n'est pas
+    réentrant. Les entrées/sorties quantifiées (int8) sont converties ici.
+    """
+
+    def __init__(self, model_path: str, buckets=INFERENCE_BUCKETS, num_threads: int = TFLITE_NUM_THREADS):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Modèle TFLite non trouvé: {model_path}")
+        with open(model_path, 'rb') as f:
+            self.model_content = f.read()
+        self.model_path = model_path
+        self.buckets = tuple(buckets)
+        self.num_threads = num_threads
+        self._interpreters = {}
+        self._interpreter_class = tflite_interpreter_class()
+        self._lock = threading.Lock()
+        probe = self._interpreter(1)
+        self.input_shape = tuple(probe.get_input_details()[0]['shape'][1:])
+
+    def _interpreter(self, batch_size: int):
+        interpreter = self._interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = self._interpreter_class(model_content=self.model_content, num_threads=self.num_threads)
+            input_details = interpreter.get_input_details()[0]
+            shape = list(input_details['shape'])
+            if shape[0] != batch_size:
+                interpreter.resize_tensor_input(input_details['index'], [batch_size] + shape[1:])
+            interpreter.allocate_tensors()
+            self._interpreters[batch_size] = interpreter
+        return interpreter
+
+    def _forward(self, chunk: np.ndarray) -> np.ndarray:
+        interpreter = self._interpreter(chunk.shape[0])
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+
+        if input_details['dtype'] != np.float32:
+            scale, zero_point = input_details['quantization']
+            info = np.iinfo(input_details['dtype'])
+            chunk = np.clip(np.round(chunk / scale + zero_point), info.min, info.max)
+        interpreter.set_tensor(input_details['index'], chunk.astype(input_details['dtype']))
+        interpreter.invoke()
+        outputs = interpreter.get_tensor(output_details['index'])
+
+        if output_details['dtype'] != np.float32:
+            scale, zero_point = output_details['quantization']
+            outputs = (outputs.astype(np.float32) - zero_point) * scale
+        return outputs
+
+    def predict(self, x, verbose: int = 0) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            return predict_bucketed(x, self.buckets, self._forward)
+
+    def warmup(self):
+        for bucket in self.buckets:
+            self.predict(np.zeros((bucket,) + self.input_shape, dtype=np.float32))
+
+
+def tflite_path(model_path: str, variant: str = TFLITE_VARIANT, tflite_dir: str = TFLITE_DIR) -> str:
+    """
+    Chemin du modèle TFLite exporté par tflite_convert.py, ex. tflite/enhanced_model_resaved.int8.tflite
+    """
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(tflite_dir, f"{stem}.{variant}.tflite")
+
+
+def load_predictor(model_path: str, custom_objects: dict = None):
+    """
+    Charge le prédicteur d'un modèle selon INFERENCE_BACKEND
+
+    Args:
+        model_path: Chemin du modèle Keras (.h5)
+        custom_objects: Couches personnalisées pour le chargement Keras, ou fonction qui les renvoie
+            (appelée seulement si le modèle Keras est chargé, pour ne pas importer TensorFlow avant)
+
+    Returns:
+        TFLiteModel chauffé si INFERENCE_BACKEND='tflite' et que la variante existe,
+        sinon le résultat de compile_for_inference sur le modèle Keras
+    """
+    if INFERENCE_BACKEND == 'tflite':
+        path = tflite_path(model_path)
+        if os.path.exists(path):
+            predictor = TFLiteModel(path)
+            predictor.warmup()
+            print(f"Modèle TFLite chargé: {path}")
+            return predictor
+        print(f"Modèle TFLite absent ({path}), retour au modèle Keras")
+
+    import tensorflow as tf
+    if callable(custom_objects):
+        custom_objects = custom_objects()
+    keras_model = tf.keras.models.load_model(model_path, custom_objects=custom_objects, compile=False)
+    return compile_for_inference(keras_model)
@@ -0,0 +1,110 @@
+import io
+import numpy as np
+
+NPY_MIMETYPE = 'application/x-npy'
+RAW_MIMETYPE = 'application/octet-stream'
+# Types acceptés pour les corps bruts, toujours little-endian
+RAW_DTYPES = {'float32': '<f4', 'int16': '<i2'}
+
+
+def read_npy(data: bytes) -> np.ndarray:
+    """
+    Décode un corps de requête au format .npy sans copier les données
+
+    Args:
+        data: Octets du fichier .npy
+
+    Returns:
+        Tableau numpy en lecture seule, vue sur `data` (sans pickle)
+    """
+    try:
+        stream = io.BytesIO(data)
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        if dtype.hasobject:
+            raise ValueError("object arrays are not supported")
+        count = int(np.prod(shape)) if shape else 1
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=stream.tell())
+        return array.reshape(shape, order='F' if fortran_order else 'C')
+    except Exception as e:
+        raise ValueError(f"Invalid .npy body: {e}")
+
+
+def read_raw(data: bytes, shape_header: str, dtype_header: str = 'float32', scale_header: str = None) -> np.ndarray:
+    """
+    Décode un corps binaire brut little-endian décrit par les en-têtes X-Shape / X-Dtype / X-Scale
+
+    Args:
+        data: Octets du corps
+        shape_header: Forme, ex. "5000,12"
+        dtype_header: 'float32' ou 'int16'
+        scale_header: Facteur optionnel appliqué aux échantillons int16 (ex. 1/gain en mV)
+
+    Returns:
+        Tableau numpy; vue en lecture seule sur `data` sauf si un facteur est appliqué
+    """
+    dtype = RAW_DTYPES.get((dtype_header or 'float32').lower())
+    if dtype is None:
+        raise ValueError(f"X-Dtype must be one of {sorted(RAW_DTYPES)}")
+    try:
+        shape = tuple(int(x) for x in shape_header.split(',') if x.strip())
+    except (AttributeError, ValueError):
+        raise ValueError("X-Shape header is required, e.g. '5000,12'")
+    if not shape or any(n <= 0 for n in shape):
+        raise ValueError("X-Shape must contain positive dimensions")
+    expected = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if len(data) != expected:
+        raise ValueError(f"Body is {len(data)} bytes, X-Shape/X-Dtype describe {expected}")
+    array = np.frombuffer(data, dtype=dtype).reshape(shape)
+    if scale_header:
+        array = array * np.float32(float(scale_header))
+    return array
+
+
+def is_tensor_body(req) -> bool:
+    return req.mimetype in (NPY_MIMETYPE, RAW_MIMETYPE)
+
+
+def read_tensor(req) -> np.ndarray:
+    """
+    Lit un corps .npy (application/x-npy) ou brut (application/octet-stream + X-Shape/X-Dtype)
+
+    Args:
+        req: Requête Flask
+
+    Returns:
+        Tableau numpy décodé par np.frombuffer
+    """
+    if req.mimetype == NPY_MIMETYPE:
+        return read_npy(req.get_data())
+    return read_raw(req.get_data(), req.headers.get('X-Shape'), req.headers.get('X-Dtype', 'float32'),
+                    req.headers.get('X-Scale'))
+
+
+def read_batch(req, key: str = 'signals') -> list:
+    """
+    Lit un lot de signaux: JSON {"signals": [...]} / liste JSON, ou un tableau binaire (read_tensor)
+    dont le premier axe indexe les signaux
+
+    Args:
+        req: Requête Flask
+        key: Clé JSON contenant la liste de signaux
+
+    Returns:
+        Liste de signaux, dans l'ordre de la requête
+    """
+    if is_tensor_body(req):
+        batch = read_tensor(req)
+        if batch.ndim < 2:
+            raise ValueError("The binary batch must have the signals on its first axis.")
+        return list(batch)
+
+    data = req.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON list or an object with a '{key}' list.")
+    return data
@@ -0,0 +1,148 @@
+import numpy as np
+from scipy import signal
+import neurokit2 as nk
+import biosppy.signals.ecg as ecg
+import warnings
+from fast_delineation import clean_leads, detect_rpeaks, refine_rpeaks
+warnings.filterwarnings("ignore", category=UserWarning)
+
+# Traitement d'une dérivation, sans dépendance à TensorFlow pour pouvoir
+# être exécuté dans les processus du pool d'extraction
+
+
+def filter_data(val):
+    """
+    Filtre le signal ECG avec un filtre passe-bande
+
+    Args:
+        val: Signal ECG
+
+    Returns:
+        Signal ECG filtré
+    """
+    ecg_signal = val
+    Fs = 500  
+    N = ecg_signal.shape[1]
+    t = ((np.linspace(0, N - 1, N)) / (Fs))
+    cover = t.shape[0]
+    t = t.reshape(1, cover)
+    n = 2  
+
+    Fcutoff_low = 0.5
+    Wn_low = ((2 * Fcutoff_low) / (Fs))
+    b_low, a_low = signal.butter(n, Wn_low, 'high')
+    xn_filtered_LF = signal.filtfilt(b_low, a_low, ecg_signal)
+
+    Fcutoff_high = 40
+    Wn_high = ((2 * Fcutoff_high) / (Fs))
+    b_high, a_high = signal.butter(n, Wn_high, 'low')
+    xn_filtered_HF = signal.filtfilt(b_high, a_high, xn_filtered_LF)
+
+    return xn_filtered_HF
+
+
+def fused_reference(cleaned, reference='rms'):
+    """
+    Construit le signal de référence pour la détection commune des pics R
+
+    Args:
+        cleaned: Dérivations nettoyées (n_leads, n_samples)
+        reference: 'rms' (moyenne quadratique des dérivations) ou indice 0-based d'une dérivation
+
+    Returns:
+        Signal 1-D de référence
+    """
+    if reference == 'rms':
+        return np.sqrt(np.mean(np.square(cleaned), axis=0))
+    index = int(reference)
+    if not 0 <= index < cleaned.shape[0]:
+        raise ValueError(f"Reference lead {index} out of range ({cleaned.shape[0]} leads)")
+    return cleaned[index]
+
+
+def shared_rpeaks(filtered_leads, reference='rms', method='neurokit', sampling_rate=500):
+    """
+    Détecte les pics R une seule fois sur une référence commune aux dérivations
+
+    Args:
+        filtered_leads: Dérivations filtrées par filter_data (n_leads, n_samples)
+        reference: Voir fused_reference
+        method: 'neurokit' (hamilton + correct_rpeaks) ou 'fast' (fast_delineation.detect_rpeaks)
+
+    Returns:
+        Indices des pics R sans le premier ni le dernier battement, ou None si pas assez de pics
+    """
+    cleaned = clean_leads(np.atleast_2d(filtered_leads), sampling_rate)
+    ref = fused_reference(cleaned, reference)
+    if method == 'fast':
+        rdet = detect_rpeaks(ref[np.newaxis, :], sampling_rate)[0]
+    else:
+        rdet, = ecg.hamilton_segmenter(signal=ref, sampling_rate=sampling_rate)
+        rdet, = ecg.correct_rpeaks(signal=ref, rpeaks=rdet, sampling_rate=sampling_rate, tol=0.05)
+    if rdet.size <= 4:
+        return None
+    return rdet[1:-1]
+
+
+def return_peaks(ecg_test, rdet=None):
+    """
+    Détecte les pics et intervalles importants dans le signal ECG
+
+    Args:
+        ecg_test: Signal ECG
+        rdet: Pics R communs (shared_rpeaks); détectés sur cette dérivation si None
+
+    Returns:
+        Signal nettoyé et informations sur les pics ou 'INCOMPLETE' si pas assez de pics
+    """
+    try:
+        cleaned = nk.ecg_clean(ecg_test, sampling_rate=500)
+
+        if rdet is None:
+            rdet, = ecg.hamilton_segmenter(signal=cleaned, sampling_rate=500)
+            rdet, = ecg.correct_rpeaks(signal=cleaned, rpeaks=rdet, sampling_rate=500, tol=0.05)
+
+            if (rdet.size <= 4):
+                return 'INCOMPLETE'
+
+            rdet = np.delete(rdet, -1)
+            rdet = np.delete(rdet, 0)
+        else:
+            # Mêmes battements que la référence, recentrés sur le pic de cette dérivation
+            rdet = refine_rpeaks(cleaned, rdet, sampling_rate=500)
+        rpeaks = {'ECG_R_Peaks': rdet}
+
+        cleaned_base = nk.signal_detrend(cleaned, order=0)
+
+        signals, waves = nk.ecg_delineate(cleaned_base, rpeaks, sampling_rate=500, method="dwt")
+
+        if (waves['ECG_T_Peaks'] is None):
+            return 'INCOMPLETE'
+        elif (waves['ECG_R_Onsets'] is None):
+            return 'INCOMPLETE'
+        elif (waves['ECG_R_Offsets'] is None):
+            return 'INCOMPLETE'
+
+        rpeakss = rpeaks.copy()
+        temppo = 4 - len(rpeakss['ECG_R_Peaks'])
+
+        if temppo > 0:
+            for i in range(temppo):
+                rpeakss['ECG_R_Peaks'] = np.append(rpeakss['ECG_R_Peaks'], rpeakss['ECG_R_Peaks'][-1] + 1)
+
+        signals1, waves1 = nk.ecg_delineate(cleaned_base, rpeakss, sampling_rate=500, method="peak")
+
+        if waves1['ECG_Q_Peaks'] is None:
+            return 'INCOMPLETE'
+
+        if temppo > 0:
+            if len(waves1['ECG_Q_Peaks']) > temppo:
+                for j in range(temppo):
+                    waves1['ECG_Q_Peaks'] = waves1['ECG_Q_Peaks'][:-1]
+
+        return (
+            cleaned_base, [waves['ECG_T_Peaks'], waves['ECG_R_Onsets'], waves['ECG_R_Offsets'], waves1['ECG_Q_Peaks']])
+
+    except Exception:
+        return 'INCOMPLETE'
+
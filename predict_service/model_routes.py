@@ -0,0 +1,90 @@
+import hmac
+import os
+import traceback
+import numpy as np
+from flask import Blueprint, request, jsonify
+
+from registry import registry, VersionNotLoaded
+
+# /models/<name>/activate exige l'en-tête X-Admin-Token, tout comme /models/<name>/predict
+# pour une version inactive pas encore chargée; sans MODEL_ADMIN_TOKEN, ces appels sont refusés
+MODEL_ADMIN_TOKEN = os.environ.get('MODEL_ADMIN_TOKEN')
+# Même variable que predict.py et app.py: en mode 'workers', les modèles servis vivent dans les workers
+SERVING_MODE = os.environ.get('SERVING_MODE', 'threads')
+
+models_bp = Blueprint('models', __name__)
+
+
+def is_admin() -> bool:
+    # Fermé par défaut: sans jeton configuré, personne n'est administrateur
+    if not MODEL_ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), MODEL_ADMIN_TOKEN)
+
+
+@models_bp.route('/models', methods=['GET'])
+def list_models():
+    return jsonify(registry.stats()), 200
+
+
+@models_bp.route('/models/<name>/activate', methods=['POST'])
+def activate_model(name):
+    # Hot swap: {"version": "<fichier du MODEL_DIR>"}
+    if not is_admin():
+        return jsonify({'error': 'Forbidden'}), 403
+    if SERVING_MODE == 'workers':
+        # Le registre de ce processus ne sert pas les prédictions: le changement n'atteindrait pas les workers
+        return jsonify({'error': 'Activation is not supported with SERVING_MODE=workers; '
+                                 'restart the model workers with the new MODEL_PATH/HF_MODEL_PATH'}), 409
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    if not version:
+        return jsonify({'error': 'version is required'}), 400
+    try:
+        previous = registry.activate(name, version)
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 404
+    except (ValueError, FileNotFoundError, OSError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print("Exception during model activation:", traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'name': name, 'version': version, 'previous': previous}), 200
+
+
+@models_bp.route('/models/<name>/predict', methods=['POST'])
+def predict_with_model(name):
+    # Sert n'importe quel modèle du registre dans ce processus, à côté du modèle principal
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON body required'}), 400
+    try:
+        # Charger une autre version peut décharger des modèles: réservé à l'administrateur
+        model = registry.get(name, data.get('version'), load_inactive=is_admin())
+    except VersionNotLoaded as e:
+        return jsonify({'error': f"{e}; only loaded versions can be served without the admin token"}), 403
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 404
+    except (ValueError, FileNotFoundError, OSError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if name == 'mi':
+            if 'ecg' not in data:
+                return jsonify({'error': 'ECG data is missing'}), 400
+            from utils import predict_ecg
+            prediction = predict_ecg(model, np.array(data['ecg']))
+            if prediction is None:
+                return jsonify({'prediction': None, 'class': 'NORM'}), 200
+            return jsonify({'prediction': int(prediction), 'class': 'MI' if prediction == 1 else 'NORM'}), 200
+
+        array = data.get('array', data.get('ecg'))
+        if array is None:
+            return jsonify({'success': False, 'error': 'No array provided in JSON.'}), 400
+        result = model.predict_from_array(np.array(array, dtype=np.float64))
+        result = {k: (v.tolist() if isinstance(v, np.ndarray) else v.item() if isinstance(v, np.generic) else v)
+                  for k, v in result.items()}
+        return jsonify(result), 200
+    except Exception as e:
+        print("Exception during prediction:", traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
@@ -1,6 +1,12 @@
 import os
-from flask import Flask, request, jsonify
-from utils import predict_signal
+from startup import phase, ServiceLoader, ServiceNotReady
+with phase('import flask'):
+    from flask import Flask, request, jsonify
+from ingest import read_batch, read_tensor, is_tensor_body
+from batching import MicroBatcher
+from model_routes import models_bp
+from worker_pool import ModelWorkerPool
+from inference import INFERENCE_BACKEND
 import json
 from flask_cors import CORS
 import traceback
@@ -8,28 +14,98 @@ import numpy as np
 
 app = Flask(__name__)
 CORS(app)
+app.register_blueprint(models_bp)
+
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 64))
+# 'threads' (model in this process) or 'workers' (requests handed to ModelWorkerPool processes)
+SERVING_MODE = os.environ.get('SERVING_MODE', 'threads')
+
+
+def load_service(phase):
+    if SERVING_MODE == 'workers':
+        with phase('start model workers'):
+            return ModelWorkerPool(models=('mi',)).start()
+    # TensorFlow, neurokit2/biosppy and the model load in the background; routes wait on loader.get()
+    if INFERENCE_BACKEND != 'tflite':
+        # The TFLite backend only imports TensorFlow if its exported model is missing
+        with phase('import tensorflow'):
+            import tensorflow
+    with phase('import neurokit2, biosppy'):
+        import neurokit2
+        import biosppy
+    with phase('import utils'):
+        import utils
+    with phase('load model'):
+        utils.get_model()
+    return utils
+
+
+loader = ServiceLoader(load_service).start()
+
+# Concurrent /predict calls share model.predict through the micro-batcher
+MICRO_BATCHING = os.environ.get('MICRO_BATCHING', '1') == '1' and SERVING_MODE != 'workers'
+batcher = MicroBatcher(
+    lambda features_list: loader.value.predict_features_batch(loader.value.get_model(), features_list),
+    max_batch_size=int(os.environ.get('BATCH_MAX_SIZE', 32)),
+    max_wait_ms=float(os.environ.get('BATCH_MAX_WAIT_MS', 2)),
+) if MICRO_BATCHING else None
 
 @app.route('/')
 def root():
     return 'Prediction service is alive', 200
 
 
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'}), 200
+
+
+@app.route('/readyz')
+def readyz():
+    status = loader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+def not_ready(e):
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @app.route('/predict', methods=['POST'])
 
 def predict():
-    data = request.get_json()
+    if is_tensor_body(request):
+        # application/x-npy or raw little-endian body (X-Shape, X-Dtype), decoded without copy
+        try:
+            ecg = read_tensor(request)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        data = request.get_json()
 
-    if not data:
-        return jsonify({'error': 'No ECG signal provided'}), 400
-    if 'ecg' not in data:
-        return jsonify({'error': 'ECG data is missing'}), 400
+        if not data:
+            return jsonify({'error': 'No ECG signal provided'}), 400
+        if 'ecg' not in data:
+            return jsonify({'error': 'ECG data is missing'}), 400
 
-    ecg = data['ecg']
-    ecg = np.array(ecg) 
+        ecg = data['ecg']
+        ecg = np.array(ecg) 
 
-    
     try:
-        prediction = predict_signal(ecg)
+        service = loader.get()
+    except ServiceNotReady as e:
+        return not_ready(e)
+
+    try:
+        if SERVING_MODE == 'workers':
+            prediction = service.call('mi.predict', ecg)
+        elif batcher is not None:
+            features = service.signal_features(ecg)
+            prediction = batcher(features) if features is not None else None
+            service.log_prediction(prediction)
+        else:
+            prediction = service.predict_signal(ecg)
         if prediction is None:
             return jsonify({'prediction': None, 'class': 'NORM'}), 200
         return jsonify({'prediction': int(prediction), 'class': 'MI' if prediction == 1 else 'NORM'}), 200
@@ -37,6 +113,54 @@ def predict():
         print("Exception during prediction:", traceback.format_exc())  
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics/batching')
+def batching_metrics():
+    if batcher is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(enabled=True, **batcher.stats())), 200
+
+@app.route('/metrics/workers')
+def worker_metrics():
+    if SERVING_MODE != 'workers' or not loader.ready:
+        return jsonify({'enabled': SERVING_MODE == 'workers', 'ready': False}), 200
+    return jsonify(dict(enabled=True, **loader.value.stats())), 200
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    # JSON {"signals": [ecg, ...]} or an application/x-npy (n, samples, 12) array
+    try:
+        signals = read_batch(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not signals:
+        return jsonify({'error': 'No ECG signals provided'}), 400
+    if len(signals) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch larger than {MAX_BATCH_SIZE} signals'}), 413
+
+    try:
+        service = loader.get()
+    except ServiceNotReady as e:
+        return not_ready(e)
+
+    try:
+        if SERVING_MODE == 'workers':
+            outcomes = service.call('mi.batch', signals)
+        else:
+            outcomes = service.predict_ecg_batch(service.get_model(), signals)
+    except Exception as e:
+        print("Exception during batch prediction:", traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+    results = []
+    for i, (prediction, error) in enumerate(outcomes):
+        if error is not None:
+            results.append({'index': i, 'error': error})
+        elif prediction is None:
+            results.append({'index': i, 'prediction': None, 'class': 'NORM'})
+        else:
+            results.append({'index': i, 'prediction': int(prediction), 'class': 'MI' if prediction == 1 else 'NORM'})
+    return jsonify({'results': results}), 200
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,156 @@
+import numpy as np
+from functools import lru_cache
+from scipy import signal as scipy_signal
+from scipy import stats
+from scipy.interpolate import interp1d
+from scipy.ndimage import median_filter
+from scipy.signal import resample
+
+
+@lru_cache(maxsize=16)
+def design_filters(freq_ech: int):
+    """
+    Conçoit (une seule fois par fréquence) le passe-bande 0.5-40 Hz et le coupe-bande 50 Hz
+
+    Args:
+        freq_ech: Fréquence d'échantillonnage en Hz
+
+    Returns:
+        (sos passe-bande, b coupe-bande, a coupe-bande)
+    """
+    sos_bandpass = scipy_signal.butter(4, [0.5, 40], btype='band', fs=freq_ech, output='sos')
+    b_notch, a_notch = scipy_signal.iirnotch(50, 30, fs=freq_ech)
+    return sos_bandpass, b_notch, a_notch
+
+
+class PreprocessingEngine:
+    """
+    Prétraitement vectorisé d'un lot de signaux de forme (n_records, n_samples).
+
+    Chaque étape travaille sur le dernier axe et reproduit exactement le
+    traitement signal par signal d'ECGSingleFileProcessor.
+    """
+
+    def __init__(self, longueur_cible: int = 187, freq_echantillonnage: int = 360, fenetre_mediane: int = 71):
+        self.longueur_cible = longueur_cible
+        self.freq_echantillonnage = freq_echantillonnage
+        self.fenetre_mediane = fenetre_mediane
+
+    @staticmethod
+    def as_batch(signaux) -> np.ndarray:
+        signaux = np.asarray(signaux, dtype=np.float64)
+        if signaux.ndim == 1:
+            signaux = signaux[np.newaxis, :]
+        if signaux.ndim != 2:
+            raise ValueError("Input must be a 1-D signal or a 2-D (n_records, n_samples) array.")
+        return signaux
+
+    def filtrer(self, signaux: np.ndarray, freq_ech: int = None) -> np.ndarray:
+        if freq_ech is None:
+            freq_ech = self.freq_echantillonnage
+        try:
+            sos_bandpass, b_notch, a_notch = design_filters(int(freq_ech))
+            signaux_filtres = scipy_signal.sosfilt(sos_bandpass, signaux, axis=-1)
+            return scipy_signal.filtfilt(b_notch, a_notch, signaux_filtres, axis=-1)
+        except Exception:
+            return signaux
+
+    def supprimer_derive_baseline(self, signaux: np.ndarray, fenetre_mediane: int = None) -> np.ndarray:
+        if fenetre_mediane is None:
+            fenetre_mediane = self.fenetre_mediane
+        try:
+            # Équivalent de scipy.signal.medfilt (bords complétés par des zéros), ligne par ligne
+            baseline = median_filter(signaux, size=(1, fenetre_mediane), mode='constant', cval=0.0)
+            return signaux - baseline
+        except Exception:
+            return signaux
+
+    def supprimer_outliers(self, signaux: np.ndarray, threshold: float = 3.0) -> np.ndarray:
+        try:
+            z_scores = np.abs(stats.zscore(signaux, axis=-1))
+            outliers = ~(z_scores < threshold)
+            # Les échantillons aberrants intérieurs sont remplacés par la moyenne de leurs voisins
+            outliers[:, 0] = False
+            outliers[:, -1] = False
+            if not outliers.any():
+                return signaux
+            voisins = np.empty_like(signaux)
+            voisins[:, 1:-1] = (signaux[:, :-2] + signaux[:, 2:]) / 2
+            return np.where(outliers, voisins, signaux)
+        except Exception:
+            return signaux
+
+    def reechantillonner(self, signaux: np.ndarray) -> np.ndarray:
+        longueur_originale = signaux.shape[-1]
+        if longueur_originale == self.longueur_cible:
+            return signaux
+        try:
+            return resample(signaux, self.longueur_cible, axis=-1)
+        except Exception:
+            indices_originaux = np.linspace(0, longueur_originale - 1, longueur_originale)
+            indices_cibles = np.linspace(0, longueur_originale - 1, self.longueur_cible)
+            return interp1d(indices_originaux, signaux, kind='linear', axis=-1)(indices_cibles)
+
+    def normaliser(self, signaux: np.ndarray, methode: str = "min_max"):
+        """
+        Normalise chaque ligne dans [0, 1]
+
+        Returns:
+            (signaux normalisés, liste des statistiques de normalisation par ligne)
+        """
+        if methode == "min_max":
+            signal_min = signaux.min(axis=-1, keepdims=True)
+            signal_max = signaux.max(axis=-1, keepdims=True)
+            amplitude = signal_max - signal_min
+            with np.errstate(divide='ignore', invalid='ignore'):
+                signaux_normalises = np.where(amplitude > 0, (signaux - signal_min) / amplitude, 0.0)
+            statistiques = [
+                {
+                    "methode": "min_max",
+                    "min_original": float(mn),
+                    "max_original": float(mx),
+                    "amplitude": float(mx - mn)
+                }
+                for mn, mx in zip(signal_min[:, 0], signal_max[:, 0])
+            ]
+        elif methode == "z_score":
+            moyenne = signaux.mean(axis=-1, keepdims=True)
+            ecart_type = signaux.std(axis=-1, keepdims=True)
+            signaux_std = (signaux - moyenne) / ecart_type
+            signal_min = signaux_std.min(axis=-1, keepdims=True)
+            signal_max = signaux_std.max(axis=-1, keepdims=True)
+            signaux_normalises = (signaux_std - signal_min) / (signal_max - signal_min)
+            statistiques = [
+                {
+                    "methode": "z_score",
+                    "moyenne": float(m),
+                    "ecart_type": float(s)
+                }
+                for m, s in zip(moyenne[:, 0], ecart_type[:, 0])
+            ]
+        else:
+            raise ValueError(f"Unknown normalisation method: {methode}")
+
+        return np.clip(signaux_normalises, 0, 1), statistiques
+
+    def pretraiter(self, signaux, freq_ech: int = None, filtrer: bool = True, methode: str = "min_max"):
+        """
+        Chaîne complète: filtrage, ligne de base, outliers, rééchantillonnage, normalisation
+
+        Args:
+            signaux: Tableau (n_records, n_samples) ou signal 1-D
+            freq_ech: Fréquence d'échantillonnage des signaux
+            filtrer: False pour sauter le filtrage et la ligne de base
+            methode: "min_max" ou "z_score"
+
+        Returns:
+            (entrées du modèle de forme (n_records, longueur_cible, 1), statistiques par ligne)
+        """
+        signaux = self.as_batch(signaux)
+        if filtrer:
+            signaux = self.filtrer(signaux, freq_ech)
+            signaux = self.supprimer_derive_baseline(signaux)
+        signaux = self.supprimer_outliers(signaux)
+        signaux = self.reechantillonner(signaux)
+        signaux, statistiques = self.normaliser(signaux, methode)
+        return signaux[:, :, np.newaxis], statistiques
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Répertoire des fichiers de modèles; une version est un nom de fichier de ce répertoire
+MODEL_DIR = os.environ.get('MODEL_DIR', '.')
+# Budget mémoire des modèles chargés (poids estimés); 0 = illimité
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 2048))
+DEFAULT_VERSIONS = {
+    'mi': os.environ.get('MODEL_PATH', 'enhanced_model_resaved.h5'),
+    'hf': os.environ.get('HF_MODEL_PATH', 'best_ecg_hybrid_model.h5'),
+}
+
+
+def _load_mi(path):
+    from inference import load_predictor
+    return load_predictor(path)
+
+
+def _load_hf(path):
+    from test import ECGSingleFileProcessor
+    return ECGSingleFileProcessor(path)
+
+
+# Le modèle MI (12 dérivations) donne un prédicteur, le modèle d'insuffisance cardiaque un processeur complet
+FACTORIES = {'mi': _load_mi, 'hf': _load_hf}
+
+
+def estimate_bytes(obj) -> int:
+    """
+    Estime la mémoire des poids d'un modèle chargé
+
+    Args:
+        obj: Prédicteur (CompiledModel, TFLiteModel, modèle Keras) ou ECGSingleFileProcessor
+
+    Returns:
+        Taille en octets (0 si inconnue)
+    """
+    predictor = getattr(obj, 'predictor', obj)
+    if hasattr(predictor, 'model_content'):
+        return len(predictor.model_content)
+    model = getattr(predictor, 'model', predictor)
+    if hasattr(model, 'count_params'):
+        return int(model.count_params()) * 4
+    return 0
+
+
+class VersionNotLoaded(Exception):
+    pass
+
+
+class ModelRegistry:
+    """
+    Charge chaque version de modèle une seule fois et la partage entre les requêtes
+
+    Chaque nom ('mi', 'hf') a une version active; activate() charge la nouvelle
+    version puis bascule le pointeur sous verrou, sans redémarrage. Les requêtes
+    en cours gardent leur référence à l'ancienne version. Au-delà du budget
+    mémoire, les versions inactives les moins récemment utilisées sont déchargées;
+    une version active n'est jamais déchargée.
+    """
+
+    def __init__(self, factories=FACTORIES, active=DEFAULT_VERSIONS, model_dir: str = MODEL_DIR,
+                 memory_budget_mb: float = MODEL_MEMORY_BUDGET_MB):
+        self.factories = dict(factories)
+        self.model_dir = model_dir
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._active = dict(active)
+        self._entries = OrderedDict()
+        self._load_locks = {}
+        self._lock = threading.Lock()
+
+    def _path(self, version: str) -> str:
+        if not version or os.path.basename(version) != version:
+            raise ValueError(f"Invalid model version: {version!r}")
+        return os.path.join(self.model_dir, version)
+
+    def get(self, name: str, version: str = None, load_inactive: bool = True):
+        """
+        Args:
+            name: Nom du modèle ('mi' ou 'hf')
+            version: Version voulue, la version active si None
+            load_inactive: False pour refuser de charger une version inactive absente
+
+        Returns:
+            Modèle chargé (chargé à la première demande)
+
+        Raises:
+            KeyError: nom de modèle inconnu
+            ValueError: version invalide
+            VersionNotLoaded: version inactive non chargée avec load_inactive=False
+        """
+        if name not in self.factories:
+            raise KeyError(f"Unknown model: {name}")
+        with self._lock:
+            version = version or self._active[name]
+            key = (name, version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['last_used'] = time.time()
+                self._entries.move_to_end(key)
+                return entry['model']
+            if not load_inactive and version != self._active[name]:
+                raise VersionNotLoaded(f"Model {name} version {version} is not loaded")
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Un seul chargement par version, sans bloquer les autres modèles
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return entry['model']
+            started = time.perf_counter()
+            model = self.factories[name](self._path(version))
+            entry = {
+                'model': model,
+                'bytes': estimate_bytes(model),
+                'load_seconds': round(time.perf_counter() - started, 3),
+                'last_used': time.time(),
+            }
+            with self._lock:
+                self._entries[key] = entry
+                self._evict(keep=key)
+        print(f"Modèle {name} chargé: {version} en {entry['load_seconds']:.2f} s")
+        return model
+
+    def activate(self, name: str, version: str):
+        """
+        Charge `version` puis en fait la version active de `name`
+
+        Returns:
+            Version précédemment active
+        """
+        self.get(name, version)
+        with self._lock:
+            previous = self._active[name]
+            self._active[name] = version
+            # L'ancienne version, désormais inactive, peut libérer le budget
+            self._evict(keep=(name, version))
+        return previous
+
+    def unload(self, name: str, version: str) -> bool:
+        with self._lock:
+            return self._entries.pop((name, version), None) is not None
+
+    def _evict(self, keep):
+        # Appelé sous self._lock
+        if self.memory_budget <= 0:
+            return
+        active = set(self._active.items())
+        while sum(e['bytes'] for e in self._entries.values()) > self.memory_budget:
+            # Version inactive la moins récemment utilisée
+            victim = next((key for key in self._entries if key != keep and key not in active), None)
+            if victim is None:
+                break
+            self._entries.pop(victim)
+            print(f"Modèle {victim[0]} déchargé (budget mémoire): {victim[1]}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                'active': dict(self._active),
+                'memory_budget_mb': self.memory_budget / (1024 * 1024),
+                'loaded_mb': round(sum(e['bytes'] for e in self._entries.values()) / (1024 * 1024), 3),
+                'loaded': [
+                    {
+                        'name': name,
+                        'version': version,
+                        'active': self._active.get(name) == version,
+                        'size_mb': round(e['bytes'] / (1024 * 1024), 3),
+                        'load_seconds': e['load_seconds'],
+                        'idle_seconds': round(now - e['last_used'], 3),
+                    }
+                    for (name, version), e in self._entries.items()
+                ],
+            }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+# 'background' (le serveur répond pendant le chargement) ou 'eager' (chargement avant de servir)
+MODEL_LOADING = os.environ.get('MODEL_LOADING', 'background')
+
+_started = time.perf_counter()
+_phases = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Mesure une étape du démarrage (import, chargement du modèle...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _phases[name] = round(elapsed, 3)
+        print(f"Démarrage: {name} en {elapsed:.2f} s")
+
+
+def startup_timings() -> dict:
+    with _lock:
+        return {
+            'uptime_s': round(time.perf_counter() - _started, 3),
+            # Liste pour garder l'ordre des étapes dans la réponse JSON
+            'phases': [{'phase': name, 'seconds': seconds} for name, seconds in _phases.items()],
+        }
+
+
+class ServiceNotReady(Exception):
+    pass
+
+
+class ServiceLoader:
+    """
+    Charge les dépendances lourdes et le modèle dans un thread d'arrière-plan
+
+    `load_fn(phase)` importe et construit ce dont les routes ont besoin, en
+    découpant son travail avec `phase(...)`; sa valeur de retour est rendue
+    par get() une fois le chargement terminé.
+    """
+
+    def __init__(self, load_fn, name: str = 'model-loader'):
+        self.load_fn = load_fn
+        self.value = None
+        self.error = None
+        self.ready_after_s = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self, mode: str = MODEL_LOADING):
+        self._thread.start()
+        if mode == 'eager':
+            self._done.wait()
+        return self
+
+    def _run(self):
+        try:
+            self.value = self.load_fn(phase)
+        except Exception as e:
+            self.error = f"{e.__class__.__name__}: {e}"
+            print("Échec du chargement:", traceback.format_exc())
+        finally:
+            self.ready_after_s = round(time.perf_counter() - _started, 3)
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def get(self, timeout: float = 0):
+        """
+        Args:
+            timeout: Attente maximale du chargement, en secondes
+
+        Returns:
+            Valeur rendue par load_fn
+
+        Raises:
+            ServiceNotReady: si le chargement est en cours ou a échoué
+        """
+        if not self._done.wait(timeout):
+            raise ServiceNotReady('Model is loading')
+        if self.error is not None:
+            raise ServiceNotReady(f'Model failed to load: {self.error}')
+        return self.value
+
+    def status(self) -> dict:
+        # Un service chargé peut tomber ensuite (ModelWorkerPool.failure: worker non relancé)
+        failure = getattr(self.value, 'failure', None) if self.ready else None
+        return dict(
+            ready=self.ready and failure is None,
+            loading=not self._done.is_set(),
+            error=self.error or failure,
+            ready_after_s=self.ready_after_s,
+            **startup_timings(),
+        )
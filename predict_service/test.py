@@ -1,65 +1,81 @@
 import numpy as np
 import pandas as pd
-import tensorflow as tf
-from scipy import signal as scipy_signal
-from scipy.interpolate import interp1d
-from scipy.signal import resample, butter, filtfilt
-from scipy import stats
 import os
 import json
 import warnings
-from typing import Tuple, Dict, Optional
+from functools import lru_cache
+from typing import Tuple, Dict, Optional, List
+
+from preprocessing import PreprocessingEngine
+from inference import load_predictor
 
 warnings.filterwarnings('ignore')
 
 
-class SelfAttention(tf.keras.layers.Layer):
-    def __init__(self, attention_dim=128, **kwargs):
-        super(SelfAttention, self).__init__(**kwargs)
-        self.attention_dim = attention_dim
-
-    def build(self, input_shape):
-        self.W_q = self.add_weight(
-            name='query_weight',
-            shape=(input_shape[-1], self.attention_dim),
-            initializer='glorot_uniform',
-            trainable=True
-        )
-        self.W_k = self.add_weight(
-            name='key_weight',
-            shape=(input_shape[-1], self.attention_dim),
-            initializer='glorot_uniform',
-            trainable=True
-        )
-        self.W_v = self.add_weight(
-            name='value_weight',
-            shape=(input_shape[-1], self.attention_dim),
-            initializer='glorot_uniform',
-            trainable=True
-        )
-        super(SelfAttention, self).build(input_shape)
-
-    def call(self, inputs):
-        Q = tf.keras.backend.dot(inputs, self.W_q)
-        K_mat = tf.keras.backend.dot(inputs, self.W_k)
-        V = tf.keras.backend.dot(inputs, self.W_v)
-
-        attention_scores = tf.keras.backend.batch_dot(Q, K_mat, axes=[2, 2])
-        attention_scores = attention_scores / tf.keras.backend.sqrt(
-            tf.keras.backend.cast(self.attention_dim, dtype='float32'))
-
-        attention_weights = tf.keras.backend.softmax(attention_scores)
-        attended_values = tf.keras.backend.batch_dot(attention_weights, V)
-
-        return attended_values
-
-    def compute_output_shape(self, input_shape):
-        return (input_shape[0], input_shape[1], self.attention_dim)
-
-    def get_config(self):
-        config = super().get_config()
-        config.update({"attention_dim": self.attention_dim})
-        return config
+@lru_cache(maxsize=1)
+def keras_custom_objects() -> Dict:
+    """
+    Couches personnalisées du modèle Keras; TensorFlow n'est importé qu'ici, au premier
+    chargement Keras, et jamais par le backend TFLite
+    """
+    import tensorflow as tf
+
+    class SelfAttention(tf.keras.layers.Layer):
+        def __init__(self, attention_dim=128, **kwargs):
+            super(SelfAttention, self).__init__(**kwargs)
+            self.attention_dim = attention_dim
+
+        def build(self, input_shape):
+            self.W_q = self.add_weight(
+                name='query_weight',
+                shape=(input_shape[-1], self.attention_dim),
+                initializer='glorot_uniform',
+                trainable=True
+            )
+            self.W_k = self.add_weight(
+                name='key_weight',
+                shape=(input_shape[-1], self.attention_dim),
+                initializer='glorot_uniform',
+                trainable=True
+            )
+            self.W_v = self.add_weight(
+                name='value_weight',
+                shape=(input_shape[-1], self.attention_dim),
+                initializer='glorot_uniform',
+                trainable=True
+            )
+            super(SelfAttention, self).build(input_shape)
+
+        def call(self, inputs):
+            Q = tf.keras.backend.dot(inputs, self.W_q)
+            K_mat = tf.keras.backend.dot(inputs, self.W_k)
+            V = tf.keras.backend.dot(inputs, self.W_v)
+
+            attention_scores = tf.keras.backend.batch_dot(Q, K_mat, axes=[2, 2])
+            attention_scores = attention_scores / tf.keras.backend.sqrt(
+                tf.keras.backend.cast(self.attention_dim, dtype='float32'))
+
+            attention_weights = tf.keras.backend.softmax(attention_scores)
+            attended_values = tf.keras.backend.batch_dot(attention_weights, V)
+
+            return attended_values
+
+        def compute_output_shape(self, input_shape):
+            return (input_shape[0], input_shape[1], self.attention_dim)
+
+        def get_config(self):
+            config = super().get_config()
+            config.update({"attention_dim": self.attention_dim})
+            return config
+
+    return {'SelfAttention': SelfAttention}
+
+
+def __getattr__(name):
+    # `from test import SelfAttention` (tflite_convert.py) définit la couche à la demande
+    if name == 'SelfAttention':
+        return keras_custom_objects()['SelfAttention']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class ECGSingleFileProcessor:
@@ -68,12 +84,12 @@ class ECGSingleFileProcessor:
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Modèle non trouvé: {model_path}")
 
-        custom_objects = {'SelfAttention': SelfAttention}
-        self.model = tf.keras.models.load_model(model_path, custom_objects=custom_objects)
+        self.predictor = load_predictor(model_path, custom_objects=keras_custom_objects)
 
         self.longueur_cible = longueur_cible
         self.freq_echantillonnage = freq_echantillonnage
-        self.statistiques_normalisation = {}
+        # Aucun état par appel: une instance partagée peut servir des requêtes en parallèle
+        self.engine = PreprocessingEngine(longueur_cible, freq_echantillonnage)
 
         self.class_names = {
             0: "Normal",
@@ -132,96 +148,27 @@ class ECGSingleFileProcessor:
             return {}
 
     def filtrer_signal_ecg(self, signal: np.ndarray, freq_ech: int = None) -> np.ndarray:
-        if freq_ech is None:
-            freq_ech = self.freq_echantillonnage
-
-        try:
-            sos_bandpass = scipy_signal.butter(4, [0.5, 40], btype='band', fs=freq_ech, output='sos')
-            signal_filtre = scipy_signal.sosfilt(sos_bandpass, signal)
-
-            sos_notch = scipy_signal.iirnotch(50, 30, fs=freq_ech)
-            signal_filtre = scipy_signal.filtfilt(sos_notch[0], sos_notch[1], signal_filtre)
-
-            return signal_filtre
-        except:
-            return signal
+        return self.engine.filtrer(self.engine.as_batch(signal), freq_ech)[0]
 
     def supprimer_derive_baseline(self, signal: np.ndarray, fenetre_mediane: int = 71) -> np.ndarray:
-        try:
-            baseline = scipy_signal.medfilt(signal, kernel_size=fenetre_mediane)
-            signal_corrige = signal - baseline
-            return signal_corrige
-        except:
-            return signal
+        return self.engine.supprimer_derive_baseline(self.engine.as_batch(signal), fenetre_mediane)[0]
 
     def reechantillonner_vers_longueur_cible(self, signal: np.ndarray) -> np.ndarray:
-        longueur_originale = len(signal)
-
-        if longueur_originale == self.longueur_cible:
-            return signal
-
-        try:
-            signal_reechantillonne = resample(signal, self.longueur_cible)
-            return signal_reechantillonne
-        except:
-            indices_originaux = np.linspace(0, longueur_originale - 1, longueur_originale)
-            indices_cibles = np.linspace(0, longueur_originale - 1, self.longueur_cible)
-
-            interpolateur = interp1d(indices_originaux, signal, kind='linear')
-            signal_reechantillonne = interpolateur(indices_cibles)
-
-            return signal_reechantillonne
+        return self.engine.reechantillonner(self.engine.as_batch(signal))[0]
 
     def supprimer_outliers(self, signal: np.ndarray, threshold: float = 3.0) -> np.ndarray:
-        try:
-            z_scores = np.abs(stats.zscore(signal))
-            outliers_mask = z_scores < threshold
+        return self.engine.supprimer_outliers(self.engine.as_batch(signal), threshold)[0]
 
-            if np.sum(~outliers_mask) > 0:
-                signal_clean = signal.copy()
-                outlier_indices = np.where(~outliers_mask)[0]
-
-                for idx in outlier_indices:
-                    if idx > 0 and idx < len(signal) - 1:
-                        signal_clean[idx] = (signal[idx - 1] + signal[idx + 1]) / 2
-
-                return signal_clean
-
-            return signal
-        except:
-            return signal
+    def normaliser_avec_statistiques(self, signal: np.ndarray, methode: str = "min_max") -> Tuple[np.ndarray, Dict]:
+        signal_normalise, statistiques = self.engine.normaliser(self.engine.as_batch(signal), methode)
+        return signal_normalise[0], statistiques[0]
 
     def normaliser_vers_format_dataset(self, signal: np.ndarray, methode: str = "min_max") -> np.ndarray:
-        if methode == "min_max":
-            signal_min = np.min(signal)
-            signal_max = np.max(signal)
-
-            if signal_max - signal_min > 0:
-                signal_normalise = (signal - signal_min) / (signal_max - signal_min)
-            else:
-                signal_normalise = np.zeros_like(signal)
-
-            self.statistiques_normalisation = {
-                "methode": "min_max",
-                "min_original": float(signal_min),
-                "max_original": float(signal_max),
-                "amplitude": float(signal_max - signal_min)
-            }
-
-        elif methode == "z_score":
-            signal_std = (signal - np.mean(signal)) / np.std(signal)
-            signal_min = np.min(signal_std)
-            signal_max = np.max(signal_std)
-            signal_normalise = (signal_std - signal_min) / (signal_max - signal_min)
+        return self.normaliser_avec_statistiques(signal, methode)[0]
 
-            self.statistiques_normalisation = {
-                "methode": "z_score",
-                "moyenne": float(np.mean(signal)),
-                "ecart_type": float(np.std(signal))
-            }
-
-        signal_normalise = np.clip(signal_normalise, 0, 1)
-        return signal_normalise
+    def preprocesser_lot(self, signaux: np.ndarray, freq_ech: int = None, filtrer: bool = True,
+                         methode: str = "min_max") -> Tuple[np.ndarray, List[Dict]]:
+        return self.engine.pretraiter(signaux, freq_ech, filtrer=filtrer, methode=methode)
 
     def preprocesser_signal_complet(self, chemin_base: str) -> Tuple[np.ndarray, Dict]:
         chemin_dat = chemin_base + '.dat'
@@ -249,12 +196,12 @@ class ECGSingleFileProcessor:
         signal_sans_derive = self.supprimer_derive_baseline(signal_filtre)
         signal_clean = self.supprimer_outliers(signal_sans_derive)
         signal_reechantillonne = self.reechantillonner_vers_longueur_cible(signal_clean)
-        signal_normalise = self.normaliser_vers_format_dataset(signal_reechantillonne)
+        signal_normalise, statistiques = self.normaliser_avec_statistiques(signal_reechantillonne)
 
         metadonnees.update({
             "longueur_originale": len(signal_original),
             "longueur_finale": len(signal_normalise),
-            "statistiques_normalisation": self.statistiques_normalisation
+            "statistiques_normalisation": statistiques
         })
 
         return signal_normalise, metadonnees
@@ -262,7 +209,7 @@ class ECGSingleFileProcessor:
     def predire_classe(self, signal_normalise: np.ndarray) -> Tuple[int, float, np.ndarray]:
         try:
             signal_pour_modele = signal_normalise.reshape(1, -1, 1)
-            predictions_proba = self.model.predict(signal_pour_modele, verbose=0)
+            predictions_proba = self.predictor.predict(signal_pour_modele, verbose=0)
             predicted_class = np.argmax(predictions_proba[0])
             confidence = np.max(predictions_proba[0])
 
@@ -301,7 +248,7 @@ class ECGSingleFileProcessor:
             'all_probabilities': all_probabilities,
             'signal_preprocessed': signal_normalise,
             'metadata': metadonnees,
-            'preprocessing_stats': self.statistiques_normalisation
+            'preprocessing_stats': metadonnees.get('statistiques_normalisation', {})
         }
 
         self.afficher_resultats(results)
@@ -326,6 +273,16 @@ class ECGSingleFileProcessor:
 
         print("-" * 50)
 
+    def resultat_prediction(self, probabilities: np.ndarray) -> dict:
+        predicted_class = int(np.argmax(probabilities))
+        return {
+            'predicted_class': predicted_class,
+            'predicted_class_name': self.class_names[predicted_class],
+            'predicted_full_name': self.class_full_names[predicted_class],
+            'confidence': float(np.max(probabilities)),
+            'all_probabilities': probabilities,
+        }
+
     def predict_from_array(self, array: np.ndarray, preprocess: bool = True, normalisation_method: str = "min_max") -> dict:
         if not isinstance(array, np.ndarray):
             raise ValueError("Input must be a numpy array.")
@@ -337,15 +294,50 @@ class ECGSingleFileProcessor:
         result = {}
         pred = self.predire_classe(arr)
         if pred[0] is not None:
-            result['predicted_class'] = int(pred[0])
-            result['predicted_class_name'] = self.class_names[pred[0]]
-            result['predicted_full_name'] = self.class_full_names[pred[0]]
-            result['confidence'] = float(pred[1])
-            result['all_probabilities'] = pred[2]
+            result = self.resultat_prediction(pred[2])
         else:
             result['error'] = 'Prediction failed.'
         return result
 
+    def predict_batch_from_arrays(self, arrays: List, preprocess: bool = True,
+                                  normalisation_method: str = "min_max") -> List[dict]:
+        results = [None] * len(arrays)
+
+        # Les signaux de même longueur sont prétraités ensemble
+        groupes = {}
+        for i, array in enumerate(arrays):
+            try:
+                arr = np.asarray(array, dtype=np.float64).squeeze()
+                if arr.ndim != 1 or arr.size < 2:
+                    raise ValueError("Each signal must be a 1-D array.")
+                if not preprocess and arr.shape[0] != self.longueur_cible:
+                    raise ValueError(f"Signal length must be {self.longueur_cible} without preprocessing.")
+            except (ValueError, TypeError) as e:
+                results[i] = {'error': str(e)}
+                continue
+            groupes.setdefault(arr.shape[0], []).append((i, arr))
+
+        entrees, indices = [], []
+        for membres in groupes.values():
+            lot = np.stack([arr for _, arr in membres])
+            if preprocess:
+                lot, _ = self.engine.pretraiter(lot, filtrer=False, methode=normalisation_method)
+            else:
+                lot = lot[:, :, np.newaxis]
+            entrees.append(lot)
+            indices.extend(i for i, _ in membres)
+
+        if entrees:
+            try:
+                predictions_proba = self.predictor.predict(np.concatenate(entrees, axis=0), verbose=0)
+                for i, probabilities in zip(indices, predictions_proba):
+                    results[i] = self.resultat_prediction(probabilities)
+            except Exception:
+                for i in indices:
+                    results[i] = {'error': 'Prediction failed.'}
+
+        return results
+
 
 def analyser_fichier_ecg_unique(chemin_base: str,
                                 model_path: str = "best_ecg_hybrid_model.h5") -> Dict:
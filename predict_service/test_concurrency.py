@@ -0,0 +1,123 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Stress test du service insuffisance cardiaque (app.py) en concurrence:
+# chaque réponse concurrente doit être identique à la réponse séquentielle
+# du même enregistrement (classe, probabilités, statistiques de prétraitement).
+#   python test_concurrency.py [--url http://localhost:5001] [--threads 8] [--requests 400]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TOLERANCE = 1e-5
+
+
+def load_cases(records_dir):
+    cases = []
+    for dat_path in sorted(glob.glob(os.path.join(records_dir, '*', '*.dat'))):
+        base = dat_path[:-4]
+        if not os.path.exists(base + '.hea'):
+            continue
+        with open(dat_path, 'rb') as f:
+            dat = f.read()
+        with open(base + '.hea', 'rb') as f:
+            hea = f.read()
+        signal = (np.frombuffer(dat, dtype=np.int16).astype(np.float64) / 1000.0).tolist()
+        name = os.path.basename(base)
+        # Même enregistrement par les deux chemins: tableau JSON et fichiers .dat/.hea
+        cases.append(('array', name, signal))
+        cases.append(('file', name, (dat, hea)))
+    return cases
+
+
+class InProcessClient:
+    def __init__(self):
+        import app
+        app.loader.get(timeout=600)
+        self.client = app.app.test_client()
+
+    def send(self, kind, name, payload):
+        if kind == 'array':
+            response = self.client.post('/predict', json={'array': payload})
+        else:
+            dat, hea = payload
+            response = self.client.post('/predict', data={
+                'file': (io.BytesIO(dat), name + '.dat'),
+                'hea': (io.BytesIO(hea), name + '.hea'),
+            }, content_type='multipart/form-data')
+        return response.status_code, response.get_json()
+
+
+class HttpClient:
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip('/') + '/predict'
+        self.session = requests.Session()
+
+    def send(self, kind, name, payload):
+        if kind == 'array':
+            response = self.session.post(self.url, json={'array': payload}, timeout=60)
+        else:
+            dat, hea = payload
+            response = self.session.post(self.url, files={
+                'file': (name + '.dat', dat),
+                'hea': (name + '.hea', hea),
+            }, timeout=60)
+        return response.status_code, response.json()
+
+
+def signature(status, body):
+    """Partie de la réponse qui doit être déterministe."""
+    stats = body.get('preprocessing_stats') or {}
+    return (
+        status,
+        body.get('predicted_class'),
+        np.asarray(body.get('all_probabilities') or [], dtype=np.float64),
+        {k: v for k, v in stats.items() if isinstance(v, (int, float))},
+    )
+
+
+def same(a, b):
+    if a[0] != b[0] or a[1] != b[1] or a[2].shape != b[2].shape:
+        return False
+    if not np.allclose(a[2], b[2], atol=TOLERANCE):
+        return False
+    return a[3].keys() == b[3].keys() and all(abs(a[3][k] - b[3][k]) <= TOLERANCE for k in a[3])
+
+
+def run(client, cases, threads, n_requests):
+    started = time.perf_counter()
+    reference = {(kind, name): signature(*client.send(kind, name, payload)) for kind, name, payload in cases}
+    sequential_s = time.perf_counter() - started
+
+    order = [cases[i % len(cases)] for i in range(n_requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(lambda case: (case, signature(*client.send(*case))), order))
+    concurrent_s = time.perf_counter() - started
+
+    mismatches = [(kind, name) for (kind, name, _), got in outcomes if not same(reference[(kind, name)], got)]
+    print(f"Séquentiel: {len(cases)} requêtes en {sequential_s:.2f} s ({len(cases) / sequential_s:.1f} req/s)")
+    print(f"Concurrent: {n_requests} requêtes sur {threads} threads en {concurrent_s:.2f} s "
+          f"({n_requests / concurrent_s:.1f} req/s)")
+    print(f"Réponses divergentes: {len(mismatches)}")
+    for kind, name in mismatches[:10]:
+        print(f"  {kind} {name}")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test concurrent du service de prédiction")
+    parser.add_argument('--url', help="service déjà lancé; sinon app.py est chargé dans ce processus")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--records', default=os.path.join(BASE_DIR, 'patients_test'))
+    args = parser.parse_args()
+
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    ok = run(client, load_cases(args.records), args.threads, args.requests)
+    sys.exit(0 if ok else 1)
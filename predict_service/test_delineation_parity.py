@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import numpy as np
+import wfdb
+
+from lead_processing import filter_data, return_peaks
+from fast_delineation import fast_return_peaks
+
+# Compare le délinéateur rapide au chemin neurokit sur les enregistrements de back/test
+RECORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back', 'test')
+WAVES = ('T_peaks', 'R_onsets', 'R_offsets', 'Q_peaks')
+# Tolérance d'appariement par onde, en ms
+TOLERANCES_MS = (60, 30, 30, 20)
+# Accord moyen minimal par onde pour que DELINEATOR=fast cesse d'être expérimental
+MIN_AGREEMENT = {'T_peaks': 0.90, 'R_onsets': 0.90, 'R_offsets': 0.90, 'Q_peaks': 0.90}
+# Part des dérivations où les deux chemins s'accordent sur le statut INCOMPLETE
+MIN_STATUS_AGREEMENT = 1.0
+FS = 500
+
+
+def list_records(base_dir):
+    records = []
+    for class_dir in sorted(os.listdir(base_dir)):
+        class_path = os.path.join(base_dir, class_dir)
+        if not os.path.isdir(class_path) or class_dir == 'pcg':
+            continue
+        for name in sorted(os.listdir(class_path)):
+            base = os.path.splitext(name)[0]
+            if name.endswith('.hea') and os.path.exists(os.path.join(class_path, base + '.dat')):
+                records.append(os.path.join(class_path, base))
+    return records
+
+
+def agreement(reference, candidate, tolerance):
+    """Part des points de référence ayant un point candidat à moins de `tolerance` échantillons."""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    reference = reference[~np.isnan(reference)]
+    candidate = candidate[~np.isnan(candidate)]
+    if reference.size == 0:
+        return None
+    if candidate.size == 0:
+        return 0.0
+    distances = np.abs(reference[:, None] - candidate[None, :]).min(axis=1)
+    return float(np.mean(distances <= tolerance))
+
+
+def compare_record(record_path):
+    signal_data, _ = wfdb.rdsamp(record_path)
+    leads = filter_data(signal_data.T[:12])
+
+    start = time.perf_counter()
+    reference = [return_peaks(lead) for lead in leads]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = fast_return_peaks(leads, FS)
+    fast_time = time.perf_counter() - start
+
+    scores = {wave: [] for wave in WAVES}
+    incomplete_match = 0
+    for ref, cand in zip(reference, fast):
+        ref_incomplete = isinstance(ref, str)
+        cand_incomplete = isinstance(cand, str)
+        incomplete_match += ref_incomplete == cand_incomplete
+        if ref_incomplete or cand_incomplete:
+            continue
+        for k, (wave, tol_ms) in enumerate(zip(WAVES, TOLERANCES_MS)):
+            if ref[1][k] is None:
+                continue
+            score = agreement(ref[1][k], cand[1][k], tol_ms * FS / 1000.0)
+            if score is not None:
+                scores[wave].append(score)
+
+    return reference_time, fast_time, scores, incomplete_match / len(leads)
+
+
+def main(base_dir=RECORDS_DIR):
+    records = list_records(base_dir)
+    if not records:
+        print(f"Aucun enregistrement trouvé dans {base_dir}")
+        return 1
+
+    total_ref, total_fast = 0.0, 0.0
+    all_scores = {wave: [] for wave in WAVES}
+    failures = []
+    for record_path in records:
+        ref_time, fast_time, scores, status_agreement = compare_record(record_path)
+        total_ref += ref_time
+        total_fast += fast_time
+        summary = ', '.join(
+            f"{wave}={np.mean(values):.2f}" if values else f"{wave}=n/a" for wave, values in scores.items()
+        )
+        print(f"{os.path.basename(record_path)}: neurokit {ref_time * 1000:.0f} ms, fast {fast_time * 1000:.0f} ms, "
+              f"statut {status_agreement:.2f}, {summary}")
+        for wave, values in scores.items():
+            all_scores[wave].extend(values)
+        if status_agreement < MIN_STATUS_AGREEMENT:
+            failures.append(f"{os.path.basename(record_path)}: statut {status_agreement:.2f} < {MIN_STATUS_AGREEMENT}")
+
+    print("-" * 50)
+    for wave, tol_ms in zip(WAVES, TOLERANCES_MS):
+        values = all_scores[wave]
+        print(f"Accord {wave} (±{tol_ms} ms): {np.mean(values):.3f}" if values else f"Accord {wave}: n/a")
+        if not values or np.mean(values) < MIN_AGREEMENT[wave]:
+            failures.append(f"{wave}: {np.mean(values) if values else 0.0:.3f} < {MIN_AGREEMENT[wave]}")
+    print(f"Temps total: neurokit {total_ref:.2f} s, fast {total_fast:.2f} s, accélération x{total_ref / max(total_fast, 1e-9):.1f}")
+    if failures:
+        print("Seuils non atteints, DELINEATOR=fast reste expérimental:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("Seuils atteints")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else RECORDS_DIR))
@@ -0,0 +1,152 @@
+import glob
+import os
+import sys
+import numpy as np
+from scipy import signal as scipy_signal
+from scipy import stats
+from scipy.interpolate import interp1d
+from scipy.signal import resample
+
+from preprocessing import PreprocessingEngine
+
+# Vérifie que PreprocessingEngine reproduit l'ancien pipeline signal par signal
+# de test.py (avant le moteur vectorisé) sur les enregistrements de back/test.
+#   python test_preprocessing_parity.py [dossier]
+
+RECORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back', 'test')
+RTOL = 1e-9
+ATOL = 1e-12
+# Fenêtres du chemin par lot (/predict/batch), en échantillons
+BATCH_WINDOW = 1000
+
+
+# --- Ancien pipeline, recopié tel quel depuis test.py ---
+
+def reference_filtrer(signal, freq_ech):
+    try:
+        sos_bandpass = scipy_signal.butter(4, [0.5, 40], btype='band', fs=freq_ech, output='sos')
+        signal_filtre = scipy_signal.sosfilt(sos_bandpass, signal)
+        sos_notch = scipy_signal.iirnotch(50, 30, fs=freq_ech)
+        return scipy_signal.filtfilt(sos_notch[0], sos_notch[1], signal_filtre)
+    except Exception:
+        return signal
+
+
+def reference_baseline(signal, fenetre_mediane=71):
+    try:
+        return signal - scipy_signal.medfilt(signal, kernel_size=fenetre_mediane)
+    except Exception:
+        return signal
+
+
+def reference_outliers(signal, threshold=3.0):
+    try:
+        z_scores = np.abs(stats.zscore(signal))
+        outliers_mask = z_scores < threshold
+        if np.sum(~outliers_mask) > 0:
+            signal_clean = signal.copy()
+            for idx in np.where(~outliers_mask)[0]:
+                if 0 < idx < len(signal) - 1:
+                    signal_clean[idx] = (signal[idx - 1] + signal[idx + 1]) / 2
+            return signal_clean
+        return signal
+    except Exception:
+        return signal
+
+
+def reference_reechantillonner(signal, longueur_cible=187):
+    longueur_originale = len(signal)
+    if longueur_originale == longueur_cible:
+        return signal
+    try:
+        return resample(signal, longueur_cible)
+    except Exception:
+        indices_originaux = np.linspace(0, longueur_originale - 1, longueur_originale)
+        indices_cibles = np.linspace(0, longueur_originale - 1, longueur_cible)
+        return interp1d(indices_originaux, signal, kind='linear')(indices_cibles)
+
+
+def reference_normaliser(signal):
+    signal_min = np.min(signal)
+    signal_max = np.max(signal)
+    if signal_max - signal_min > 0:
+        signal_normalise = (signal - signal_min) / (signal_max - signal_min)
+    else:
+        signal_normalise = np.zeros_like(signal)
+    statistiques = {
+        "methode": "min_max",
+        "min_original": float(signal_min),
+        "max_original": float(signal_max),
+        "amplitude": float(signal_max - signal_min)
+    }
+    return np.clip(signal_normalise, 0, 1), statistiques
+
+
+def reference_pipeline(signal, freq_ech, filtrer=True):
+    if filtrer:
+        signal = reference_filtrer(signal, freq_ech)
+        signal = reference_baseline(signal)
+    signal = reference_outliers(signal)
+    signal = reference_reechantillonner(signal)
+    return reference_normaliser(signal)
+
+
+# --- Chargement identique à ECGSingleFileProcessor.preprocesser_signal_complet ---
+
+def load_record(base):
+    with open(base + '.dat', 'rb') as f:
+        signal = np.frombuffer(f.read(), dtype=np.int16).astype(np.float64) / 1000.0
+    with open(base + '.hea', 'r', encoding='utf-8') as f:
+        freq_ech = int(f.readline().split()[2])
+    if len(signal) % 2 == 0:
+        signal = signal.reshape(-1, 2).mean(axis=1)
+    return signal, freq_ech
+
+
+def list_records(base_dir):
+    return [path[:-4] for path in sorted(glob.glob(os.path.join(base_dir, '*', '*.dat')))
+            if os.path.exists(path[:-4] + '.hea')]
+
+
+def assert_same(name, engine_out, engine_stats, reference_out, reference_stats):
+    np.testing.assert_allclose(engine_out, reference_out, rtol=RTOL, atol=ATOL, err_msg=name)
+    for key, value in reference_stats.items():
+        if isinstance(value, float):
+            np.testing.assert_allclose(engine_stats[key], value, rtol=RTOL, atol=ATOL, err_msg=f"{name} {key}")
+        else:
+            assert engine_stats[key] == value, f"{name} {key}: {engine_stats[key]!r} != {value!r}"
+
+
+def main(base_dir=RECORDS_DIR):
+    records = list_records(base_dir)
+    if not records:
+        print(f"Aucun enregistrement trouvé dans {base_dir}")
+        return 1
+
+    engine = PreprocessingEngine()
+    for base in records:
+        name = os.path.basename(base)
+        signal, freq_ech = load_record(base)
+
+        # Chemin fichier unique: un signal, filtré à la fréquence de l'en-tête
+        reference_out, reference_stats = reference_pipeline(signal, freq_ech)
+        engine_out, engine_stats = engine.pretraiter(signal, freq_ech)
+        assert_same(name, engine_out[0, :, 0], engine_stats[0], reference_out, reference_stats)
+
+        # Chemin par lot: plusieurs fenêtres traitées ensemble, avec et sans filtrage
+        n_windows = len(signal) // BATCH_WINDOW
+        windows = signal[:n_windows * BATCH_WINDOW].reshape(n_windows, BATCH_WINDOW)
+        for filtrer in (True, False):
+            engine_out, engine_stats = engine.pretraiter(windows, freq_ech, filtrer=filtrer)
+            for i, window in enumerate(windows):
+                reference_out, reference_stats = reference_pipeline(window, freq_ech, filtrer=filtrer)
+                assert_same(f"{name}[{i}] filtrer={filtrer}", engine_out[i, :, 0], engine_stats[i],
+                            reference_out, reference_stats)
+        print(f"{name}: identique ({freq_ech} Hz, {len(signal)} échantillons, {n_windows} fenêtres)")
+
+    print(f"{len(records)} enregistrements: PreprocessingEngine == ancien pipeline (rtol={RTOL})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else RECORDS_DIR))
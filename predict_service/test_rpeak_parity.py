@@ -0,0 +1,79 @@
+import os
+import sys
+import numpy as np
+import wfdb
+
+import utils
+from test_delineation_parity import list_records
+
+# Compare les votes MI de la détection commune des pics R (RPEAK_REFERENCE=rms)
+# à la détection par dérivation (per_lead) sur les enregistrements de back/test.
+#   python test_rpeak_parity.py [dossier] [référence]
+# Le script échoue si un vote diffère: RPEAK_REFERENCE ne peut devenir commun par
+# défaut que si les deux détections donnent la même classe sur chaque enregistrement.
+
+RECORDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'back', 'test')
+REFERENCE = 'rms'
+# Part minimale d'enregistrements dont le vote est identique
+MIN_VOTE_AGREEMENT = 1.0
+
+
+def vote(model, signal_data, rpeak_reference):
+    """
+    Vote MI d'un signal avec la détection de pics R demandée
+
+    Returns:
+        (vote ou None, probabilités par battement ou None)
+    """
+    utils.RPEAK_REFERENCE = rpeak_reference
+    features = utils.signal_features(signal_data)
+    if features is None:
+        return None, None
+    predictions = np.asarray(model.predict(features, verbose=0)).reshape(-1)
+    return utils.vote_beats(predictions), predictions
+
+
+def main(base_dir=RECORDS_DIR, reference=REFERENCE):
+    records = list_records(base_dir)
+    if not records:
+        print(f"Aucun enregistrement trouvé dans {base_dir}")
+        return 1
+
+    model = utils.get_model()
+    previous = utils.RPEAK_REFERENCE
+    same_votes = 0
+    failures = []
+    try:
+        for record_path in records:
+            name = os.path.basename(record_path)
+            signal_data, _ = wfdb.rdsamp(record_path)
+            signal_data = signal_data[:, :12]
+            per_lead_vote, per_lead_probs = vote(model, signal_data, 'per_lead')
+            shared_vote, shared_probs = vote(model, signal_data, reference)
+
+            same_votes += per_lead_vote == shared_vote
+            if per_lead_vote != shared_vote:
+                failures.append(f"{name}: per_lead={per_lead_vote}, {reference}={shared_vote}")
+            beats = lambda probs: 0 if probs is None else len(probs)
+            mean = lambda probs: 'n/a' if probs is None else f"{np.mean(probs):.3f}"
+            print(f"{name}: per_lead vote={per_lead_vote} ({beats(per_lead_probs)} battements, "
+                  f"p moyen {mean(per_lead_probs)}), {reference} vote={shared_vote} "
+                  f"({beats(shared_probs)} battements, p moyen {mean(shared_probs)})")
+    finally:
+        utils.RPEAK_REFERENCE = previous
+
+    agreement = same_votes / len(records)
+    print("-" * 50)
+    print(f"Votes identiques: {same_votes}/{len(records)} ({agreement:.2f})")
+    if agreement < MIN_VOTE_AGREEMENT:
+        print(f"Votes différents, RPEAK_REFERENCE={reference} reste à activer explicitement:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"RPEAK_REFERENCE={reference} donne les mêmes votes que per_lead")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else RECORDS_DIR,
+                  sys.argv[2] if len(sys.argv) > 2 else REFERENCE))
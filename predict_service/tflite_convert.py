@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import tensorflow as tf
+import wfdb
+
+from inference import CompiledModel, TFLiteModel, tflite_path, TFLITE_DIR
+from preprocessing import PreprocessingEngine
+from test import SelfAttention
+
+# Exporte les modèles Keras en TFLite (float32, float16, int8) et compare
+# précision et latence avec le modèle Keras sur les mêmes entrées.
+#   python tflite_convert.py [--models mi hf] [--variants float32 float16 int8] [--out tflite]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS = {
+    # 12 dérivations -> caractéristiques par battement (36, 1), sortie sigmoïde
+    'mi': {'path': 'enhanced_model_resaved.h5', 'custom_objects': None,
+           'records': os.path.join(BASE_DIR, '..', 'back', 'test')},
+    # 1 dérivation -> 187 échantillons normalisés, sortie softmax
+    'hf': {'path': 'best_ecg_hybrid_model.h5', 'custom_objects': {'SelfAttention': SelfAttention},
+           'records': os.path.join(BASE_DIR, 'patients_test')},
+}
+VARIANTS = ('float32', 'float16', 'int8')
+LATENCY_CALLS = 100
+
+
+def list_records(base_dir):
+    records = []
+    for root, _, files in os.walk(base_dir):
+        for name in sorted(files):
+            base = os.path.splitext(name)[0]
+            if name.endswith('.hea') and os.path.exists(os.path.join(root, base + '.dat')):
+                records.append(os.path.join(root, base))
+    return sorted(records)
+
+
+def hf_inputs(records_dir, limit):
+    """Entrées (n, 187, 1) prétraitées comme ECGSingleFileProcessor.preprocesser_signal_complet."""
+    engine = PreprocessingEngine()
+    inputs = []
+    for record in list_records(records_dir)[:limit]:
+        header = wfdb.rdheader(record)
+        signal = np.fromfile(record + '.dat', dtype=np.int16).astype(np.float64) / 1000.0
+        if len(signal) % 2 == 0:
+            signal = signal.reshape(-1, 2).mean(axis=1)
+        entree, _ = engine.pretraiter(signal, int(header.fs))
+        inputs.append(entree)
+    return np.concatenate(inputs, axis=0).astype(np.float32)
+
+
+def mi_inputs(records_dir, limit):
+    """Caractéristiques par battement (n, 36, 1) des enregistrements 12 dérivations."""
+    from utils import signal_features
+    inputs = []
+    for record in list_records(records_dir):
+        signal, fields = wfdb.rdsamp(record)
+        if signal.shape[1] != 12:
+            continue
+        features = signal_features(signal)
+        if features is not None:
+            inputs.append(features)
+        if sum(len(f) for f in inputs) >= limit:
+            break
+    return np.concatenate(inputs, axis=0)[:limit].astype(np.float32)
+
+
+def convert(keras_model, variant, representative):
+    """
+    Args:
+        keras_model: Modèle Keras chargé
+        variant: 'float32', 'float16' ou 'int8'
+        representative: Entrées de calibration pour 'int8'
+
+    Returns:
+        Contenu du modèle TFLite
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if variant == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([representative[i:i + 1]] for i in range(len(representative)))
+    elif variant != 'float32':
+        raise ValueError(f"Unknown TFLite variant: {variant}")
+    try:
+        return converter.convert()
+    except Exception as e:
+        # Couches sans équivalent TFLite natif (ex. LSTM, attention): ops TensorFlow embarquées
+        print(f"  conversion native impossible ({e.__class__.__name__}), ajout des SELECT_TF_OPS")
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        converter._experimental_lower_tensor_list_ops = False
+        return converter.convert()
+
+
+def decisions(name, outputs):
+    if name == 'mi':
+        return (outputs.reshape(len(outputs), -1)[:, 0] > 0.5).astype(int)
+    return np.argmax(outputs, axis=1)
+
+
+def latency_ms(predictor, inputs):
+    """Latence d'un appel sur une entrée, en ms (moyenne et p95)."""
+    samples = inputs[:LATENCY_CALLS]
+    predictor.predict(samples[:1], verbose=0)
+    durations = []
+    for i in range(len(samples)):
+        started = time.perf_counter()
+        predictor.predict(samples[i:i + 1], verbose=0)
+        durations.append((time.perf_counter() - started) * 1000.0)
+    return round(float(np.mean(durations)), 3), round(float(np.percentile(durations, 95)), 3)
+
+
+def evaluate(name, label, predictor, inputs, reference, size_bytes=None):
+    outputs = predictor.predict(inputs, verbose=0)
+    mean_ms, p95_ms = latency_ms(predictor, inputs)
+    return {
+        'model': name,
+        'variant': label,
+        'size_kb': None if size_bytes is None else round(size_bytes / 1024, 1),
+        'max_abs_diff': round(float(np.max(np.abs(outputs - reference))), 6),
+        'agreement': round(float(np.mean(decisions(name, outputs) == decisions(name, reference))), 4),
+        'latency_ms_mean': mean_ms,
+        'latency_ms_p95': p95_ms,
+    }
+
+
+def run(models, variants, out_dir, limit):
+    os.makedirs(out_dir, exist_ok=True)
+    report = []
+    for name in models:
+        spec = MODELS[name]
+        model_path = os.path.join(BASE_DIR, spec['path'])
+        if not os.path.exists(model_path):
+            print(f"{name}: {spec['path']} absent, ignoré")
+            continue
+        keras_model = tf.keras.models.load_model(model_path, custom_objects=spec['custom_objects'], compile=False)
+        inputs = mi_inputs(spec['records'], limit) if name == 'mi' else hf_inputs(spec['records'], limit)
+        print(f"{name}: {len(inputs)} entrées de {spec['records']}")
+
+        reference = keras_model.predict(inputs, verbose=0)
+        report.append(evaluate(name, 'keras', keras_model, inputs, reference, os.path.getsize(model_path)))
+        report.append(evaluate(name, 'keras-compiled', CompiledModel(keras_model), inputs, reference))
+
+        for variant in variants:
+            content = convert(keras_model, variant, inputs)
+            path = tflite_path(spec['path'], variant, out_dir)
+            with open(path, 'wb') as f:
+                f.write(content)
+            print(f"  {variant}: {path}")
+            report.append(evaluate(name, f'tflite-{variant}', TFLiteModel(path), inputs, reference, len(content)))
+
+    columns = ('model', 'variant', 'size_kb', 'max_abs_diff', 'agreement', 'latency_ms_mean', 'latency_ms_p95')
+    print('\n' + ' | '.join(columns))
+    for row in report:
+        print(' | '.join(str(row[c]) for c in columns))
+    with open(os.path.join(out_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export TFLite et rapport précision/latence")
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--out', default=os.path.join(BASE_DIR, TFLITE_DIR))
+    parser.add_argument('--limit', type=int, default=500, help="nombre max d'entrées de calibration/évaluation")
+    args = parser.parse_args()
+    run(args.models, args.variants, args.out, args.limit)
@@ -1,108 +1,119 @@
 import numpy as np
-import tensorflow as tf
 from scipy.signal import resample
 import numpy as np
 import os
 import wfdb
 from scipy import signal
-import neurokit2 as nk
-import biosppy.signals.ecg as ecg
 import warnings
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
+import threading
+from lead_processing import filter_data, return_peaks, shared_rpeaks
+from fast_delineation import fast_return_peaks
+from registry import registry
 warnings.filterwarnings("ignore", category=UserWarning)
 
-# Load model once at import
-model = tf.keras.models.load_model('enhanced_model_resaved.h5', compile=False)
-
-def filter_data(val):
+# 'serial' ou 'process' (une dérivation par processus du pool)
+FEATURE_EXTRACTION_MODE = os.environ.get('FEATURE_EXTRACTION_MODE', 'serial')
+FEATURE_POOL_SIZE = int(os.environ.get('FEATURE_POOL_SIZE', min(12, os.cpu_count() or 1)))
+# 'forkserver' par défaut: utils est importé dans le thread de chargement, et forker
+# un processus multi-thread (et déjà porteur de TensorFlow) n'est pas sûr
+FEATURE_POOL_START_METHOD = os.environ.get('FEATURE_POOL_START_METHOD', 'forkserver')
+# 'neurokit' (nk.ecg_delineate) ou 'fast' (fast_delineation, NumPy sur les 12 dérivations à la fois,
+# vérifié contre neurokit par test_delineation_parity.py)
+DELINEATOR = os.environ.get('DELINEATOR', 'neurokit')
+# Détection des pics R: 'per_lead' (chaque dérivation séparément, comportement historique)
+# ou, en option, détection commune sur 'rms' ou sur l'indice 0-based d'une dérivation.
+# La détection commune change les caractéristiques du modèle MI: avec 'rms', test_rpeak_parity.py
+# trouve 10 votes identiques sur 11 enregistrements de back/test (00868_hr passe de NORM à MI),
+# elle reste donc à activer explicitement
+RPEAK_REFERENCE = os.environ.get('RPEAK_REFERENCE', 'per_lead')
+
+_lead_pool = None
+_lead_pool_lock = threading.Lock()
+
+
+def get_lead_pool():
     """
-    Filtre le signal ECG avec un filtre passe-bande
-
-    Args:
-        val: Signal ECG
+    Pool de processus réutilisable pour l'extraction par dérivation (créé à la première utilisation)
+    """
+    global _lead_pool
+    with _lead_pool_lock:
+        if _lead_pool is not None:
+            return _lead_pool
+        context = multiprocessing.get_context(FEATURE_POOL_START_METHOD)
+        if FEATURE_POOL_START_METHOD == 'forkserver':
+            # Les workers n'ont besoin que de lead_processing (sans TensorFlow ni modèle),
+            # et non de __main__, qui relancerait le chargement du service
+            context.set_forkserver_preload(['lead_processing'])
+        _lead_pool = ProcessPoolExecutor(max_workers=FEATURE_POOL_SIZE, mp_context=context)
+        return _lead_pool
+
+
+def get_model():
+    """
+    Modèle MI actif du registre (chargé une seule fois, remplaçable à chaud)
 
     Returns:
-        Signal ECG filtré
+        Prédicteur chauffé (load_predictor)
     """
-    ecg_signal = val
-    Fs = 500  
-    N = ecg_signal.shape[1]
-    t = ((np.linspace(0, N - 1, N)) / (Fs))
-    cover = t.shape[0]
-    t = t.reshape(1, cover)
-    n = 2  
+    return registry.get('mi')
 
-    Fcutoff_low = 0.5
-    Wn_low = ((2 * Fcutoff_low) / (Fs))
-    b_low, a_low = signal.butter(n, Wn_low, 'high')
-    xn_filtered_LF = signal.filtfilt(b_low, a_low, ecg_signal)
 
-    Fcutoff_high = 40
-    Wn_high = ((2 * Fcutoff_high) / (Fs))
-    b_high, a_high = signal.butter(n, Wn_high, 'low')
-    xn_filtered_HF = signal.filtfilt(b_high, a_high, xn_filtered_LF)
-
-    return xn_filtered_HF
-
-
-def return_peaks(ecg_test):
+def process_leads(leads):
     """
-    Détecte les pics et intervalles importants dans le signal ECG
+    Traite les 12 dérivations avec le délinéateur rapide, ou avec neurokit
+    en série ou dans le pool selon FEATURE_EXTRACTION_MODE. Si RPEAK_REFERENCE
+    désigne une référence commune ('rms' ou un indice), les pics R sont détectés
+    une seule fois sur celle-ci et délimitent les mêmes battements sur chaque dérivation.
 
     Args:
-        ecg_test: Signal ECG
+        leads: Tableau (12, n_samples)
 
     Returns:
-        Signal nettoyé et informations sur les pics ou 'INCOMPLETE' si pas assez de pics
+        Liste des résultats de return_peaks dans l'ordre des dérivations, ou None
+        dès qu'une dérivation est 'INCOMPLETE'
     """
-    try:
-        cleaned = nk.ecg_clean(ecg_test, sampling_rate=500)
-
-        rdet, = ecg.hamilton_segmenter(signal=cleaned, sampling_rate=500)
-        rdet, = ecg.correct_rpeaks(signal=cleaned, rpeaks=rdet, sampling_rate=500, tol=0.05)
-
-        if (rdet.size <= 4):
-            return 'INCOMPLETE'
+    filtered = filter_data(np.asarray(leads))
 
-        if len(rdet) >= 2:
-            rdet = np.delete(rdet, -1)
-            rdet = np.delete(rdet, 0)
-            rpeaks = {'ECG_R_Peaks': rdet}
-        else:
-            return 'INCOMPLETE'
-
-        cleaned_base = nk.signal_detrend(cleaned, order=0)
-
-        signals, waves = nk.ecg_delineate(cleaned_base, rpeaks, sampling_rate=500, method="dwt")
-
-        if (waves['ECG_T_Peaks'] is None):
-            return 'INCOMPLETE'
-        elif (waves['ECG_R_Onsets'] is None):
-            return 'INCOMPLETE'
-        elif (waves['ECG_R_Offsets'] is None):
-            return 'INCOMPLETE'
-
-        rpeakss = rpeaks.copy()
-        temppo = 4 - len(rpeakss['ECG_R_Peaks'])
-
-        if temppo > 0:
-            for i in range(temppo):
-                rpeakss['ECG_R_Peaks'] = np.append(rpeakss['ECG_R_Peaks'], rpeakss['ECG_R_Peaks'][-1] + 1)
-
-        signals1, waves1 = nk.ecg_delineate(cleaned_base, rpeakss, sampling_rate=500, method="peak")
-
-        if waves1['ECG_Q_Peaks'] is None:
-            return 'INCOMPLETE'
-
-        if temppo > 0:
-            if len(waves1['ECG_Q_Peaks']) > temppo:
-                for j in range(temppo):
-                    waves1['ECG_Q_Peaks'] = waves1['ECG_Q_Peaks'][:-1]
+    rdet = None
+    if RPEAK_REFERENCE != 'per_lead':
+        rdet = shared_rpeaks(filtered, RPEAK_REFERENCE, method=DELINEATOR)
+        if rdet is None:
+            return None
 
-        return (
-            cleaned_base, [waves['ECG_T_Peaks'], waves['ECG_R_Onsets'], waves['ECG_R_Offsets'], waves1['ECG_Q_Peaks']])
+    if DELINEATOR == 'fast':
+        temp_list = fast_return_peaks(filtered, rpeaks=rdet)
+        if any(isinstance(a_var, str) for a_var in temp_list):
+            return None
+        return temp_list
 
-    except Exception:
-        return 'INCOMPLETE'
+    if FEATURE_EXTRACTION_MODE != 'process':
+        temp_list = []
+        for lead_values in filtered:
+            a_var = return_peaks(lead_values, rdet)
+            if isinstance(a_var, str) and a_var == 'INCOMPLETE':
+                return None
+            temp_list.append(a_var)
+        return temp_list
+
+    pool = get_lead_pool()
+    futures = {pool.submit(return_peaks, lead_values, rdet): ind for ind, lead_values in enumerate(filtered)}
+    temp_list = [None] * len(futures)
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            a_var = future.result()
+            if isinstance(a_var, str) and a_var == 'INCOMPLETE':
+                # On rend la main tout de suite; seules les dérivations encore en file sont annulées,
+                # celles déjà démarrées vont au bout et occupent leur worker jusque-là. Avec
+                # FEATURE_POOL_SIZE >= 12, toutes démarrent ensemble: le gain est la latence, pas le CPU
+                for other in pending:
+                    other.cancel()
+                return None
+            temp_list[futures[future]] = a_var
+    return temp_list
 
 
 def extract_features_from_signal(signal_data):
@@ -120,27 +131,14 @@ def extract_features_from_signal(signal_data):
         signal_data = np.array(signal_data)
 
     value = signal_data.T
-    temp_list = []
-
-    for ind in range(12):
-        val_ind = value[ind]
-        tmpp = val_ind.shape[0]
-        val_ind = val_ind.reshape(1, tmpp)
-        val_filtered = filter_data(val_ind)
-        val_filtered = val_filtered.reshape(val_filtered.shape[1], )
-
-        a_var = return_peaks(val_filtered)
+    temp_list = process_leads([value[ind] for ind in range(12)])
 
-        if a_var == 'INCOMPLETE':
-            return None
-
-        temp_list.append(a_var)
-
-    if len(temp_list) != 12:
+    if temp_list is None or len(temp_list) != 12:
         return None
 
     features_list = []
 
+    # Avec la détection commune des pics R, toutes les dérivations ont le même nombre de battements
     mini = float('inf')
     for check_index3 in range(12):
         for second_ind3 in range(4):
@@ -223,37 +221,118 @@ def try_alternative_processing(signal_data):
     return extract_features_from_signal(normalized_signal)
 
 
-def predict_ecg(model, signal_data):
+def signal_features(signal_data):
     """
-    Prédit la classe d'un signal ECG
+    Extrait les caractéristiques d'un signal, avec le traitement alternatif en secours
 
     Args:
-        model: Modèle Keras chargé
         signal_data: Signal ECG à 12 dérivations
 
     Returns:
-        Prédiction finale (0 ou 1)
+        Caractéristiques de forme (n_battements, 36, 1) ou None
     """
     features = extract_features_from_signal(signal_data)
 
     if features is None:
         features = try_alternative_processing(signal_data)
 
+    return features
+
+
+def vote_beats(predictions):
+    """
+    Vote majoritaire sur les prédictions par battement
+
+    Args:
+        predictions: Sorties du modèle pour les battements d'un signal
+
+    Returns:
+        Prédiction finale (0 ou 1)
+    """
+    beat_predictions = [1 if pred > 0.5 else 0 for pred in predictions]
+    return 1 if sum(beat_predictions) > len(beat_predictions) / 2 else 0
+
+
+def predict_ecg(model, signal_data):
+    """
+    Prédit la classe d'un signal ECG
+
+    Args:
+        model: Prédicteur chargé (load_predictor)
+        signal_data: Signal ECG à 12 dérivations
+
+    Returns:
+        Prédiction finale (0 ou 1)
+    """
+    features = signal_features(signal_data)
+
     if features is None:
         return None
 
     predictions = model.predict(features, verbose=0)
 
-    beat_predictions = [1 if pred > 0.5 else 0 for pred in predictions]
-    final_prediction = 1 if sum(beat_predictions) > len(beat_predictions) / 2 else 0
+    return vote_beats(predictions)
 
-    return final_prediction
 
+def predict_ecg_batch(model, signals):
+    """
+    Prédit la classe de plusieurs signaux ECG avec un seul appel au modèle
 
+    Les battements de tous les signaux sont empilés dans un seul tenseur,
+    puis les sorties sont redécoupées signal par signal.
 
-def predict_signal(signal, model=model):
+    Args:
+        model: Prédicteur chargé (load_predictor)
+        signals: Liste de signaux ECG à 12 dérivations
 
-    prediction = predict_ecg(model, signal)
+    Returns:
+        Liste de (prédiction ou None, message d'erreur ou None), dans l'ordre des signaux
+    """
+    results = [None] * len(signals)
+    features_list = []
+    owners = []
+
+    for i, signal_data in enumerate(signals):
+        try:
+            features = signal_features(np.asarray(signal_data, dtype=np.float64))
+        except Exception as e:
+            results[i] = (None, str(e))
+            continue
+        if features is None:
+            results[i] = (None, None)
+            continue
+        features_list.append(features)
+        owners.append(i)
+
+    if features_list:
+        for i, prediction in zip(owners, predict_features_batch(model, features_list)):
+            results[i] = (prediction, None)
+
+    return results
+
+
+def predict_features_batch(model, features_list):
+    """
+    Prédit plusieurs jeux de caractéristiques avec un seul appel au modèle
+
+    Args:
+        model: Prédicteur chargé (load_predictor)
+        features_list: Liste de tableaux (n_battements, 36, 1), un par signal
+
+    Returns:
+        Liste des prédictions finales (0 ou 1), dans le même ordre
+    """
+    predictions = model.predict(np.concatenate(features_list, axis=0), verbose=0)
+    results = []
+    offset = 0
+    for features in features_list:
+        n = features.shape[0]
+        results.append(vote_beats(predictions[offset:offset + n]))
+        offset += n
+    return results
+
+
+def log_prediction(prediction):
     if prediction is not None:
         print("RÉSULTAT:")
         if prediction == 1:
@@ -264,4 +343,12 @@ def predict_signal(signal, model=model):
     else:
         print("RÉSULTAT: ÉCHEC")
 
+
+def predict_signal(signal, model=None):
+
+    if model is None:
+        model = get_model()
+    prediction = predict_ecg(model, signal)
+    log_prediction(prediction)
+
     return prediction
@@ -0,0 +1,338 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from inference import INFERENCE_BACKEND
+
+
+def available_cores() -> int:
+    # Respecte les cpusets (conteneurs) quand la plateforme les expose
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Threads TensorFlow par worker; workers x intra-op ne dépasse pas le nombre de cœurs
+MODEL_WORKER_INTRA_THREADS = int(os.environ.get('MODEL_WORKER_INTRA_THREADS', 1))
+MODEL_WORKER_INTER_THREADS = int(os.environ.get('MODEL_WORKER_INTER_THREADS', 1))
+MODEL_WORKERS = int(os.environ.get('MODEL_WORKERS', max(1, available_cores() // max(1, MODEL_WORKER_INTRA_THREADS))))
+# 'forkserver': les workers sont forkés d'un parent mono-thread qui a déjà importé les modules lourds
+MODEL_WORKER_START_METHOD = os.environ.get('MODEL_WORKER_START_METHOD', 'forkserver')
+MODEL_WORKER_TIMEOUT_S = float(os.environ.get('MODEL_WORKER_TIMEOUT_S', 60))
+
+# Le backend TFLite n'a pas besoin de TensorFlow (tflite_runtime, voir inference.py)
+_TENSORFLOW = [] if INFERENCE_BACKEND == 'tflite' else ['tensorflow']
+# Modules importés une fois dans le parent des workers et partagés en copy-on-write
+PRELOAD_MODULES = {
+    'mi': ['numpy', 'scipy.signal'] + _TENSORFLOW + ['neurokit2', 'biosppy.signals.ecg', 'utils'],
+    'hf': ['numpy', 'scipy.signal'] + _TENSORFLOW + ['pandas', 'preprocessing', 'test'],
+}
+
+
+def _load_mi():
+    import utils
+    return utils.get_model()
+
+
+def _load_hf():
+    from registry import registry
+    return registry.get('hf')
+
+
+def _mi_predict(ecg):
+    import numpy as np
+    import utils
+    return utils.predict_signal(np.array(ecg))
+
+
+def _mi_batch(signals):
+    import utils
+    return utils.predict_ecg_batch(utils.get_model(), signals)
+
+
+def _hf_predict(array):
+    import numpy as np
+    return _load_hf().predict_from_array(np.array(array, dtype=np.float64))
+
+
+def _hf_batch(arrays):
+    return _load_hf().predict_batch_from_arrays(arrays)
+
+
+def _hf_file(chemin_base):
+    result = _load_hf().analyser_fichier_complet(chemin_base)
+    result.pop('signal_preprocessed', None)
+    return result
+
+
+WARMUP = {'mi': _load_mi, 'hf': _load_hf}
+TASKS = {
+    'mi.predict': _mi_predict,
+    'mi.batch': _mi_batch,
+    'hf.predict': _hf_predict,
+    'hf.batch': _hf_batch,
+    'hf.file': _hf_file,
+}
+
+
+def _pin_threads(intra: int, inter: int):
+    # numpy, scipy et tensorflow sont déjà importés par le forkserver: OpenBLAS/OpenMP ont
+    # déjà lu OMP_NUM_THREADS, leurs pools sont donc limités à chaud par threadpoolctl
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=intra)
+    if INFERENCE_BACKEND == 'tflite':
+        # Les interpréteurs TFLite ont leur propre nombre de threads (TFLITE_NUM_THREADS)
+        return
+    # Avant toute opération TensorFlow du processus, sinon la configuration est refusée
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra)
+    tf.config.threading.set_inter_op_parallelism_threads(inter)
+
+
+def _worker_main(conn, models, intra, inter):
+    try:
+        _pin_threads(intra, inter)
+        for name in models:
+            WARMUP[name]()
+    except Exception as e:
+        conn.send(('failed', f"{e.__class__.__name__}: {e}"))
+        return
+    conn.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        kind, payload = message
+        try:
+            conn.send(('ok', TASKS[kind](payload)))
+        except Exception as e:
+            print("Exception in model worker:", traceback.format_exc())
+            conn.send(('error', f"{e.__class__.__name__}: {e}"))
+
+
+def _copy_outcome(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class ModelWorkerPool:
+    """
+    Pool de processus qui chargent chacun le modèle et exécutent les requêtes
+
+    Le front HTTP dépose (Future, tâche, données) dans une file partagée; un
+    thread du front par worker la vide et passe chaque tâche à son processus
+    par un pipe. Le worker traite la requête entièrement (prétraitement,
+    extraction, inférence) hors du GIL du front. Un worker mort fait échouer
+    sa seule requête en cours et est relancé; un worker qui dépasse le délai
+    de call() est arrêté et relancé de la même façon.
+    """
+
+    def __init__(self, models, n_workers: int = MODEL_WORKERS, intra_threads: int = MODEL_WORKER_INTRA_THREADS,
+                 inter_threads: int = MODEL_WORKER_INTER_THREADS, start_method: str = MODEL_WORKER_START_METHOD,
+                 timeout: float = MODEL_WORKER_TIMEOUT_S):
+        self.models = tuple(models)
+        self.n_workers = max(1, int(n_workers))
+        self.intra_threads = intra_threads
+        self.inter_threads = inter_threads
+        self.start_method = start_method
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            preload = []
+            for name in self.models:
+                preload.extend(m for m in PRELOAD_MODULES[name] if m not in preload)
+            self.ctx.set_forkserver_preload(preload)
+        self._tasks = queue.Queue()
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._ready_count = 0
+        self._failure = None
+        self._failed_workers = set()
+        # Requête en cours par worker, et workers arrêtés par call() après un dépassement de délai
+        self._running = {}
+        self._timed_out = set()
+        self._busy = 0
+        self._restarts = 0
+        self._completed = 0
+
+    def _spawn(self, worker_id):
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.models, self.intra_threads, self.inter_threads),
+            name=f'model-worker-{worker_id}',
+            daemon=True,
+        )
+        try:
+            process.start()
+        except Exception as e:
+            child_conn.close()
+            with self._ready:
+                self._failure = f"{e.__class__.__name__}: {e}"
+                self._ready.notify_all()
+            return None
+        child_conn.close()
+        with self._lock:
+            self._processes[worker_id] = process
+        try:
+            status, value = parent_conn.recv()
+        except EOFError:
+            status, value = 'failed', f'exit code {process.join(5) or process.exitcode}'
+        with self._ready:
+            if status == 'ready':
+                self._ready_count += 1
+            else:
+                self._failure = value
+            self._ready.notify_all()
+        return parent_conn if status == 'ready' else None
+
+    def _serve(self, worker_id):
+        conn = self._spawn(worker_id)
+        while conn is not None:
+            item = self._tasks.get()
+            if item is None:
+                conn.send(None)
+                return
+            future, kind, payload = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._busy += 1
+                self._running[worker_id] = future
+            sent = False
+            try:
+                conn.send((kind, payload))
+                sent = True
+                status, value = conn.recv()
+            except (EOFError, OSError) as e:
+                with self._lock:
+                    self._running.pop(worker_id, None)
+                    timed_out = worker_id in self._timed_out
+                    self._timed_out.discard(worker_id)
+                if sent and timed_out:
+                    future.set_exception(TimeoutError(f"Model worker {worker_id} timed out and was restarted"))
+                elif sent:
+                    future.set_exception(RuntimeError(f"Model worker {worker_id} died"))
+                else:
+                    # Worker mort avant de recevoir la tâche: elle repart pour un autre worker
+                    retry = Future()
+                    retry.add_done_callback(lambda done, target=future: _copy_outcome(done, target))
+                    self._tasks.put((retry, kind, payload))
+                print(f"Worker {worker_id} arrêté ({e.__class__.__name__}), relance")
+                with self._lock:
+                    self._busy -= 1
+                conn = self._restart(worker_id, conn)
+                continue
+            with self._lock:
+                self._running.pop(worker_id, None)
+                timed_out = worker_id in self._timed_out
+                self._timed_out.discard(worker_id)
+                self._busy -= 1
+                self._completed += 1
+            if status == 'ok':
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+            if timed_out:
+                # Réponse arrivée pendant que call() arrêtait le worker: il est relancé avant la tâche suivante
+                conn = self._restart(worker_id, conn)
+        # Worker impossible à (re)lancer: son feeder s'arrête, la panne est remontée par /readyz
+        with self._lock:
+            self._failed_workers.add(worker_id)
+        print(f"Worker {worker_id} abandonné: {self._failure}")
+
+    def _restart(self, worker_id, conn):
+        conn.close()
+        with self._lock:
+            self._restarts += 1
+            self._ready_count -= 1
+        return self._spawn(worker_id)
+
+    def _abort(self, future):
+        # Le worker bloqué sur `future` est tué; son feeder, réveillé par EOFError, le relance
+        with self._lock:
+            for worker_id, running in self._running.items():
+                if running is future:
+                    self._timed_out.add(worker_id)
+                    self._processes[worker_id].terminate()
+                    return
+
+    def start(self, wait: bool = True):
+        """
+        Lance les workers; avec wait=True, rend la main quand tous ont chargé leur modèle
+
+        Raises:
+            RuntimeError: si un worker n'a pas pu charger son modèle
+        """
+        started = time.perf_counter()
+        for worker_id in range(self.n_workers):
+            threading.Thread(target=self._serve, args=(worker_id,), name=f'model-worker-{worker_id}-feeder',
+                             daemon=True).start()
+        if wait:
+            with self._ready:
+                self._ready.wait_for(lambda: self._failure or self._ready_count >= self.n_workers)
+            if self._failure:
+                raise RuntimeError(f"Model worker failed to start: {self._failure}")
+            print(f"{self.n_workers} workers prêts ({self.intra_threads} intra-op / {self.inter_threads} inter-op "
+                  f"threads chacun) en {time.perf_counter() - started:.2f} s")
+        return self
+
+    @property
+    def failure(self):
+        """
+        Erreur du dernier worker qui n'a pas pu être (re)lancé, None si tous tournent
+        """
+        with self._lock:
+            if not self._failed_workers:
+                return None
+            return f"{len(self._failed_workers)}/{self.n_workers} model workers down: {self._failure}"
+
+    def submit(self, kind: str, payload) -> Future:
+        if kind not in TASKS:
+            raise KeyError(f"Unknown task: {kind}")
+        future = Future()
+        self._tasks.put((future, kind, payload))
+        return future
+
+    def call(self, kind: str, payload, timeout: float = None):
+        future = self.submit(kind, payload)
+        try:
+            return future.result(timeout if timeout is not None else self.timeout)
+        except FutureTimeout:
+            # Une tâche encore en file n'est plus envoyée à un worker; une tâche déjà envoyée
+            # bloquerait son feeder dans conn.recv(): le worker est arrêté puis relancé
+            if not future.cancel():
+                self._abort(future)
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.n_workers,
+                'alive': sum(p.is_alive() for p in self._processes.values()),
+                'ready': self._ready_count,
+                'intra_op_threads': self.intra_threads,
+                'inter_op_threads': self.inter_threads,
+                'start_method': self.start_method,
+                'queue_depth': self._tasks.qsize(),
+                'busy': self._busy,
+                'completed': self._completed,
+                'restarts': self._restarts,
+                'failed': sorted(self._failed_workers),
+            }
+
+    def close(self):
+        for _ in range(self.n_workers):
+            self._tasks.put(None)